@@ -1,9 +1,64 @@
+from time import perf_counter
+
+# taken before the imports below (tkinter, numpy, ...) so the startup
+# timeline includes them
+MODULE_START = perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog, simpledialog
+import argparse
+import csv
+import gzip
+import io
+import queue
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
 import time
 import heapq
+import itertools
+import threading
+from bisect import bisect_right
+from collections import defaultdict, deque
+import mmap
+import multiprocessing
+from multiprocessing import shared_memory
+import zlib
 import webbrowser
 
+try:
+    import numpy as np
+except ImportError:  # analytics are optional; stats fall back to plain counting
+    np = None
+
+
+# ================== STARTUP TIMELINE ================== #
+class StartupTimeline:
+    # perf_counter marks from the top of this module to a fully populated window
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.marks = []
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter()))
+
+    def report(self):
+        lines = ["Startup timeline:"]
+        prev = self.t0
+        for label, t in self.marks:
+            lines.append(
+                f"  {(t - self.t0) * 1000:8.1f} ms  (+{(t - prev) * 1000:6.1f})  {label}"
+            )
+            prev = t
+        return "\n".join(lines)
+
+
+STARTUP = StartupTimeline(MODULE_START)
+STARTUP.mark("imports")
+
 # ================== GRAPH & POSITIONS ================== #
 GRAPH = {
     "Entrance": ["Hall-1"],
@@ -27,6 +82,8 @@ NODE_POS = {
     "Shelf-E": (410, 95),
 }
 
+INF = float("inf")
+
 
 def heuristic(n, goal):
     if n not in NODE_POS or goal not in NODE_POS:
@@ -65,6 +122,475 @@ def astar(graph, start, goal):
     return None
 
 
+# ================== DYNAMIC AISLES (LPA*) ================== #
+# (a, b) with a <= b -> temporary cost, or INF while the aisle is closed
+EDGE_STATE = {}
+
+
+def aisle(a, b):
+    return (a, b) if a <= b else (b, a)
+
+
+def edge_cost(a, b):
+    return EDGE_STATE.get(aisle(a, b), 1)
+
+
+class ShortestPathTree:
+    # LPA* without a goal: keeps g/rhs for every node reachable from `source`
+    # so one tree answers routes to all shelves. After an edge change only the
+    # nodes whose distance actually changes are re-expanded.
+    def __init__(self, graph, source, cost=edge_cost):
+        self.graph = graph
+        self.source = source
+        self.cost = cost
+        self.g = defaultdict(lambda: INF)
+        self.rhs = defaultdict(lambda: INF)
+        self.rhs[source] = 0
+        self.queue = []
+        self.queued = {}
+        self.tie = itertools.count()
+        self._push(source)
+        self.compute()
+
+    def _push(self, u):
+        key = min(self.g[u], self.rhs[u])
+        self.queued[u] = key
+        heapq.heappush(self.queue, (key, next(self.tie), u))
+
+    def update_vertex(self, u):
+        if u != self.source:
+            self.rhs[u] = min(
+                (self.g[v] + self.cost(v, u) for v in self.graph.get(u, ())),
+                default=INF,
+            )
+        if self.g[u] != self.rhs[u]:
+            self._push(u)
+        else:
+            self.queued.pop(u, None)
+
+    def compute(self):
+        expanded = 0
+        while self.queue:
+            key, _, u = heapq.heappop(self.queue)
+            if self.queued.get(u) != key:
+                continue  # stale heap entry
+            del self.queued[u]
+            expanded += 1
+            if self.g[u] > self.rhs[u]:
+                self.g[u] = self.rhs[u]
+                for v in self.graph.get(u, ()):
+                    self.update_vertex(v)
+            else:
+                self.g[u] = INF
+                self.update_vertex(u)
+                for v in self.graph.get(u, ()):
+                    self.update_vertex(v)
+        return expanded
+
+    def edge_changed(self, a, b):
+        self.update_vertex(a)
+        self.update_vertex(b)
+        return self.compute()
+
+    def distance(self, goal):
+        return self.g[goal]
+
+    def path(self, goal):
+        if goal not in self.graph or self.g[goal] == INF:
+            return None
+        path = [goal]
+        cur = goal
+        while cur != self.source:
+            nxt = cur
+            cur = min(self.graph[nxt], key=lambda v: self.g[v] + self.cost(v, nxt))
+            path.append(cur)
+        return list(reversed(path))
+
+
+# ================== CONTRACTION HIERARCHY ================== #
+CH_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "library_map.ch.json"
+)
+
+
+def graph_fingerprint(graph, cost=edge_cost):
+    h = hashlib.sha1()
+    for u in sorted(graph):
+        for v in sorted(graph[u]):
+            h.update(f"{u}\x00{v}\x00{cost(u, v)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+class ContractionHierarchy:
+    # Nodes are contracted in order of importance; each contraction adds
+    # shortcut edges (remembering the node they bypass) wherever no witness
+    # path exists. Queries then only climb "upward" edges from both ends.
+    def __init__(self, rank, up, fingerprint):
+        self.rank = rank
+        self.up = up  # node -> [(higher node, weight, via or None)]
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, graph, cost=edge_cost, witness_limit=200):
+        adj = defaultdict(dict)
+        for u in graph:
+            for v in graph[u]:
+                w = cost(u, v)
+                if w != INF and u != v and w < adj[u].get(v, (INF,))[0]:
+                    adj[u][v] = (w, None)
+                    adj[v][u] = (w, None)
+        for u in graph:
+            adj.setdefault(u, {})
+        # adjacency among nodes not yet contracted; adj keeps every edge
+        live = {u: {v: w for v, (w, _) in nbrs.items()} for u, nbrs in adj.items()}
+        depth = defaultdict(int)
+
+        def witness(src, avoid, limit):
+            # distances from src without passing through `avoid`
+            dist = {src: 0}
+            heap = [(0, src)]
+            settled = 0
+            while heap and settled < witness_limit:
+                d, x = heapq.heappop(heap)
+                if d > limit:
+                    break
+                if d > dist[x]:
+                    continue
+                settled += 1
+                for y, w in live[x].items():
+                    if y == avoid:
+                        continue
+                    nd = d + w
+                    if nd < dist.get(y, INF):
+                        dist[y] = nd
+                        heapq.heappush(heap, (nd, y))
+            return dist
+
+        def shortcuts(v):
+            nbrs = list(live[v].items())
+            added = []
+            for i, (u, wu) in enumerate(nbrs):
+                rest = nbrs[i + 1 :]
+                if not rest:
+                    break
+                limit = wu + max(w for _, w in rest)
+                dist = witness(u, v, limit)
+                for x, wx in rest:
+                    if dist.get(x, INF) > wu + wx:
+                        added.append((u, x, wu + wx))
+            return added, len(nbrs)
+
+        def priority(v):
+            added, degree = shortcuts(v)
+            return len(added) - degree + depth[v], added
+
+        tie = itertools.count()
+        heap = [(priority(v)[0], next(tie), v) for v in adj]
+        heapq.heapify(heap)
+        rank = {}
+        while heap:
+            _, _, v = heapq.heappop(heap)
+            # lazy update: re-evaluate and requeue if v is no longer cheapest
+            p, added = priority(v)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, next(tie), v))
+                continue
+            for u, x, w in added:
+                if w < adj[u].get(x, (INF,))[0]:
+                    adj[u][x] = (w, v)
+                    adj[x][u] = (w, v)
+                    live[u][x] = w
+                    live[x][u] = w
+            for u in live.pop(v):
+                del live[u][v]
+                depth[u] = max(depth[u], depth[v] + 1)
+            rank[v] = len(rank)
+
+        up = {
+            v: [(u, w, via) for u, (w, via) in adj[v].items() if rank[u] > rank[v]]
+            for v in adj
+        }
+        return cls(rank, up, graph_fingerprint(graph, cost))
+
+    def save(self, path=CH_PATH):
+        data = {
+            "fingerprint": self.fingerprint,
+            "rank": self.rank,
+            "up": {v: [list(e) for e in edges] for v, edges in self.up.items()},
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=CH_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        up = {v: [tuple(e) for e in edges] for v, edges in data["up"].items()}
+        return cls(data["rank"], up, data["fingerprint"])
+
+    def _unpack(self, a, b, out):
+        # append the original edges of (a, b) to out, excluding a itself
+        via = self._via(a, b)
+        if via is None:
+            out.append(b)
+        else:
+            self._unpack(a, via, out)
+            self._unpack(via, b, out)
+
+    def _via(self, a, b):
+        lo, hi = (a, b) if self.rank[a] < self.rank[b] else (b, a)
+        best = None
+        for u, w, via in self.up[lo]:
+            if u == hi and (best is None or w < best[0]):
+                best = (w, via)
+        return best[1]
+
+    def route(self, start, goal):
+        if start not in self.rank or goal not in self.rank:
+            return None
+        if start == goal:
+            return [start]
+        dist = ({start: 0}, {goal: 0})
+        parent = ({start: None}, {goal: None})
+        heaps = ([(0, start)], [(0, goal)])
+        best, meet = INF, None
+        side = 0
+        while heaps[0] or heaps[1]:
+            if not heaps[side]:
+                side ^= 1
+            d, u = heapq.heappop(heaps[side])
+            if d <= dist[side][u]:
+                if u in dist[side ^ 1] and d + dist[side ^ 1][u] < best:
+                    best, meet = d + dist[side ^ 1][u], u
+                for v, w, _ in self.up[u]:
+                    nd = d + w
+                    if nd < dist[side].get(v, INF):
+                        dist[side][v] = nd
+                        parent[side][v] = u
+                        heapq.heappush(heaps[side], (nd, v))
+            # stop once neither frontier can beat the best meeting point
+            if min(h[0][0] if h else INF for h in heaps) >= best:
+                break
+            side ^= 1
+        if meet is None:
+            return None
+
+        forward = []
+        u = meet
+        while u is not None:
+            forward.append(u)
+            u = parent[0][u]
+        forward.reverse()
+        backward = []
+        u = parent[1][meet]
+        while u is not None:
+            backward.append(u)
+            u = parent[1][u]
+        hops = forward + backward
+
+        path = [hops[0]]
+        for a, b in zip(hops, hops[1:]):
+            self._unpack(a, b, path)
+        return path
+
+
+# ================== ROUTE PLANNER ================== #
+class RoutePlanner:
+    # One shortest-path tree per start node; every tree is repaired in place
+    # when an aisle closes, reopens or changes cost.
+    def __init__(self, graph):
+        self.graph = graph
+        self.trees = {}
+        self.ch = None
+        self.ch_state = None
+
+    def attach_ch(self, ch):
+        # only used while aisle states match the ones it was built with
+        if ch.fingerprint != graph_fingerprint(self.graph):
+            return False
+        self.ch = ch
+        self.ch_state = dict(EDGE_STATE)
+        return True
+
+    def load_ch(self, path=CH_PATH):
+        if not os.path.exists(path):
+            return False
+        try:
+            return self.attach_ch(ContractionHierarchy.load(path))
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def tree(self, start):
+        if start not in self.trees:
+            self.trees[start] = ShortestPathTree(self.graph, start)
+        return self.trees[start]
+
+    def route(self, start, goal):
+        if start not in self.graph or goal not in self.graph:
+            return None
+        # starts with a live tree (e.g. Entrance) use it; other point-to-point
+        # lookups go through the contraction hierarchy when one is loaded
+        if start not in self.trees and self.ch is not None:
+            if EDGE_STATE == self.ch_state:
+                return self.ch.route(start, goal)
+        return self.tree(start).path(goal)
+
+    def set_aisle(self, a, b, cost):
+        # cost: 1 for normal, INF (or None) for closed, anything else temporary
+        key = aisle(a, b)
+        if cost is None:
+            cost = INF
+        if cost == 1:
+            EDGE_STATE.pop(key, None)
+        else:
+            EDGE_STATE[key] = cost
+        return sum(t.edge_changed(a, b) for t in self.trees.values())
+
+
+ROUTES = RoutePlanner(GRAPH)
+
+
+# ================== MULTI-AGENT ROUTING ================== #
+class ReservationTable:
+    # Space-time reservations: (node, t) for positions, (a, b, t) for a move
+    # from a to b between t and t + 1, and nodes held from some t onward by
+    # agents that have parked at their goal.
+    def __init__(self):
+        self.vertex = set()
+        self.edge = set()
+        self.parked = {}
+        self.last_use = defaultdict(lambda: -1)
+
+    def free(self, a, b, t):
+        # may an agent at a (time t) be at b at time t + 1?
+        if (b, t + 1) in self.vertex or (b, a, t) in self.edge:
+            return False
+        return self.parked.get(b, INF) > t + 1
+
+    def reserve(self, path):
+        for t, node in enumerate(path):
+            self.vertex.add((node, t))
+            self.last_use[node] = max(self.last_use[node], t)
+            if t:
+                self.edge.add((path[t - 1], node, t - 1))
+        self.parked[path[-1]] = len(path) - 1
+
+
+class MultiAgentPlanner:
+    # Cooperative A*: agents are planned one after another in a time-expanded
+    # graph, each avoiding the reservations of those planned before it. One
+    # move or wait takes one time step; closed aisles are never used.
+    def __init__(self, graph, cost=edge_cost, horizon=64):
+        self.graph = graph
+        self.cost = cost
+        self.horizon = horizon
+        self._dist = {}
+
+    def distances(self, goal):
+        # true distance to goal ignoring other agents (the A* heuristic)
+        if goal not in self._dist:
+            dist = defaultdict(lambda: INF)
+            dist[goal] = 0
+            heap = [(0, goal)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                for v in self.graph.get(u, ()):
+                    nd = d + self.cost(u, v)
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+            self._dist[goal] = dist
+        return self._dist[goal]
+
+    def plan(self, agents, budget=0.25):
+        # agents: [(name, start, goal)] -> {name: [node at t=0, 1, ...] or None}
+        # Longest trips go first; if some carts fail, they are moved to the
+        # front and the batch is replanned while the time budget lasts.
+        # Two carts cannot start on the same node; later ones get None.
+        deadline = time.perf_counter() + budget
+        starts = set()
+        batch = []
+        result = {}
+        for agent in agents:
+            if agent[1] in starts:
+                result[agent[0]] = None
+            else:
+                starts.add(agent[1])
+                batch.append(agent)
+        order = sorted(
+            batch, key=lambda a: self.distances(a[2])[a[1]], reverse=True
+        )
+        best = None
+        tried = set()
+        while time.perf_counter() < deadline:
+            paths = self._plan_order(order, deadline)
+            failed = [a for a in order if paths[a[0]] is None]
+            if best is None or len(failed) < sum(p is None for p in best.values()):
+                best = paths
+            tried.add(tuple(a[0] for a in order))
+            order = failed + [a for a in order if paths[a[0]] is not None]
+            if not failed or tuple(a[0] for a in order) in tried:
+                break
+        if best is None:
+            best = {name: None for name, _, _ in batch}
+        result.update(best)
+        return result
+
+    def _plan_order(self, order, deadline):
+        # Carts not planned yet are parked where they stand; a cart that
+        # cannot be routed (or runs out of time) simply stays parked, so the
+        # batch is collision-free whichever carts succeed.
+        table = ReservationTable()
+        for _, start, _ in order:
+            table.parked[start] = 0
+        paths = {}
+        for name, start, goal in order:
+            del table.parked[start]
+            path = None
+            if time.perf_counter() < deadline:
+                path = self._search(start, goal, table, deadline)
+            paths[name] = path
+            table.reserve(path or [start])
+        return paths
+
+    def _search(self, start, goal, table, deadline):
+        h = self.distances(goal)
+        if h[start] == INF:
+            return None
+        tie = itertools.count()
+        heap = [(h[start], next(tie), 0, start)]
+        parent = {(start, 0): None}
+        while heap:
+            if next(tie) % 256 == 0 and time.perf_counter() > deadline:
+                return None
+            _, _, t, node = heapq.heappop(heap)
+            if node == goal and t > table.last_use[goal]:
+                path = []
+                state = (node, t)
+                while state is not None:
+                    path.append(state[0])
+                    state = parent[state]
+                return list(reversed(path))
+            if t >= self.horizon:
+                continue
+            for nxt in [node] + self.graph.get(node, []):
+                if nxt != node and self.cost(node, nxt) == INF:
+                    continue
+                state = (nxt, t + 1)
+                if state in parent or not table.free(node, nxt, t):
+                    continue
+                parent[state] = (node, t)
+                heapq.heappush(heap, (t + 1 + h[nxt], next(tie), t + 1, nxt))
+        return None
+
+
+CARTS = MultiAgentPlanner(GRAPH)
+
+
 # ================== DATA ================== #
 BOOKS = [
     {"title": "AI", "author": "Russell", "shelf": "Shelf-A"},
@@ -81,14 +607,1552 @@ SHELF_CAPACITY = {
 }
 
 
+# ================== CATALOG (thread-safe) ================== #
+class ShelfFullError(Exception):
+    def __init__(self, shelf, used, cap):
+        super().__init__(f"{shelf} is full ({used}/{cap}).")
+        self.shelf = shelf
+        self.used = used
+        self.cap = cap
+
+
+class ConflictError(Exception):
+    pass
+
+
+class Catalog:
+    # Guards BOOKS / SHELF_CAPACITY for concurrent editors. Every book has an
+    # "id" (stored in saved catalogs, so it survives a restart) and a "version"
+    # that is bumped on each change; updates and deletes must name the version
+    # they read (optimistic locking). Shelf capacity is checked and reserved
+    # under the same lock as the book list, since every change touches both.
+    def __init__(self, books, capacity):
+        self.books = books
+        self.capacity = capacity
+        self.lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._by_id = {}
+        self.used = defaultdict(int)
+        self.load(list(books))
+
+    def load(self, books):
+        # books from a saved catalog keep their ids; new ids start above them
+        with self.lock:
+            self.books[:] = books
+            self._by_id = {}
+            top = max((b.get("id", 0) for b in self.books), default=0)
+            self._ids = itertools.count(max(top + 1, next(self._ids)))
+            for b in self.books:
+                if "id" not in b:
+                    b["id"] = next(self._ids)
+                b["version"] = 0
+                self._by_id[b["id"]] = b
+            self.recount()
+
+    def recount(self):
+        with self.lock:
+            used = defaultdict(int)
+            for b in self.books:
+                used[b["shelf"]] += 1
+            self.used = used
+
+    def get(self, book_id):
+        return self._by_id.get(book_id)
+
+    def count(self, shelf):
+        return self.used[shelf]
+
+    def reserve(self, shelf):
+        with self.lock:
+            cap = self.capacity.get(shelf, 0)
+            if self.used[shelf] >= cap:
+                raise ShelfFullError(shelf, self.used[shelf], cap)
+            self.used[shelf] += 1
+
+    def release(self, shelf):
+        with self.lock:
+            self.used[shelf] -= 1
+
+    def expand(self, shelf, n=1):
+        with self.lock:
+            self.capacity[shelf] += n
+
+    def add(self, title, author, shelf):
+        book = {"title": title, "author": author, "shelf": shelf, "version": 0}
+        # reserve and append together so recount() never sees a half-done add
+        with self.lock:
+            self.reserve(shelf)
+            book["id"] = next(self._ids)
+            self._by_id[book["id"]] = book
+            self.books.append(book)
+        return book
+
+    def _check(self, book_id, version):
+        book = self._by_id.get(book_id)
+        if book is None:
+            raise ConflictError("Book was deleted by another user.")
+        if book["version"] != version:
+            raise ConflictError("Book was changed by another user.")
+        return book
+
+    def update(self, book_id, version, title, author, shelf):
+        with self.lock:
+            book = self._check(book_id, version)
+            if shelf != book["shelf"]:
+                self.reserve(shelf)
+                self.release(book["shelf"])
+            book.update(title=title, author=author, shelf=shelf)
+            book["version"] += 1
+            return book
+
+    def delete(self, book_id, version):
+        with self.lock:
+            book = self._check(book_id, version)
+            self.books.remove(book)
+            del self._by_id[book_id]
+            self.release(book["shelf"])
+            return book
+
+    def move_books(self, moves):
+        # [(book id, version, new shelf)] applied all-or-nothing: every book
+        # must still be at the version the plan was made from, and no shelf
+        # may end up over capacity
+        with self.lock:
+            if len({book_id for book_id, _, _ in moves}) != len(moves):
+                raise ValueError("A book can only be moved once per batch.")
+            books = [self._check(book_id, version) for book_id, version, _ in moves]
+            used = defaultdict(int, self.used)
+            for book, (_, _, new) in zip(books, moves):
+                used[book["shelf"]] -= 1
+                used[new] += 1
+            for shelf, n in used.items():
+                cap = self.capacity.get(shelf, 0)
+                if n > cap:
+                    raise ShelfFullError(shelf, n, cap)
+            for book, (_, _, new) in zip(books, moves):
+                book["shelf"] = new
+                book["version"] += 1
+            self.used = used
+
+
+CATALOG = Catalog(BOOKS, SHELF_CAPACITY)
+
+
+def stress_catalog(writers=16, ops=2000, seed=0):
+    # Hammers CATALOG-style add/update/delete from many threads and checks that
+    # no shelf ever ends up over capacity. Returns (adds, conflicts, full).
+    import random
+
+    capacity = {shelf: 200 for shelf in SHELF_CAPACITY}
+    cat = Catalog([], capacity)
+    shelves = list(capacity)
+    stats = {"adds": 0, "conflicts": 0, "full": 0}
+    stats_lock = threading.Lock()
+    start = threading.Barrier(writers)
+
+    def bump(key):
+        with stats_lock:
+            stats[key] += 1
+
+    def writer(n):
+        rng = random.Random(seed + n)
+        start.wait()
+        for _ in range(ops):
+            try:
+                op = rng.random()
+                if op < 0.5 or not cat.books:
+                    cat.add(f"T{n}", f"A{n}", rng.choice(shelves))
+                    bump("adds")
+                    continue
+                with cat.lock:
+                    if not cat.books:
+                        continue
+                    book = rng.choice(cat.books)
+                    book_id, version = book["id"], book["version"]
+                # other writers may touch the book between read and write
+                if op < 0.85:
+                    cat.update(book_id, version, "T", "A", rng.choice(shelves))
+                else:
+                    cat.delete(book_id, version)
+            except ConflictError:
+                bump("conflicts")
+            except ShelfFullError:
+                bump("full")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    actual = defaultdict(int)
+    for b in cat.books:
+        actual[b["shelf"]] += 1
+    for shelf, cap in capacity.items():
+        if actual[shelf] > cap or actual[shelf] != cat.used[shelf]:
+            raise AssertionError(
+                f"{shelf}: {actual[shelf]} books, counter {cat.used[shelf]}, cap {cap}"
+            )
+    return stats["adds"], stats["conflicts"], stats["full"]
+
+
+# ================== BINARY CATALOG ================== #
+# Layout (little-endian, every section 4-byte aligned):
+#   header | shelf table | record table | key offsets | search keys | string heap
+# Records are fixed 20-byte rows (book id + pointers into the string heap), so
+# any record can be decoded on its own. The search keys are
+# "title\x1fauthor\x1fshelf\n" in lowercase, one per record, and are scanned in
+# place for substring search.
+CATALOG_MAGIC = b"SLCAT\x00\x00\x01"
+CATALOG_VERSION = 2
+CATALOG_PAGE_SIZE = 200
+
+CATALOG_HEADER = struct.Struct("<8sIIIIIIIIII")
+CATALOG_SHELF = struct.Struct("<IIII")  # name_off, name_len, capacity, count
+# id, title/author offsets, lens, shelf code, availability flags
+CATALOG_BOOK = struct.Struct("<IIIHHHBx")
+BOOK_ON_LOAN = 1
+BOOK_OVERDUE = 2
+
+
+def _align4(buf):
+    buf.extend(b"\x00" * (-len(buf) % 4))
+
+
+def build_catalog(books, capacity, page_size=CATALOG_PAGE_SIZE, flags=None):
+    # flags: book id -> BOOK_* bits, so kiosks can show availability
+    shelves = list(capacity.keys())
+    for b in books:
+        if b["shelf"] not in capacity and b["shelf"] not in shelves:
+            shelves.append(b["shelf"])
+    codes = {name: i for i, name in enumerate(shelves)}
+    counts = [0] * len(shelves)
+
+    heap = bytearray()
+    interned = {}
+
+    def intern(text):
+        raw = text.encode("utf-8")
+        if raw not in interned:
+            interned[raw] = len(heap)
+            heap.extend(raw)
+        return interned[raw], len(raw)
+
+    shelf_rows = []
+    for name in shelves:
+        off, ln = intern(name)
+        shelf_rows.append([off, ln, capacity.get(name, 0)])
+
+    book_rows = bytearray()
+    keys = bytearray()
+    key_offsets = [0]
+    for i, b in enumerate(books):
+        t_off, t_len = intern(b["title"])
+        a_off, a_len = intern(b["author"])
+        if t_len > 0xFFFF or a_len > 0xFFFF:
+            raise ValueError(f"Title/author too long for catalog: {b['title'][:40]!r}")
+        code = codes[b["shelf"]]
+        counts[code] += 1
+        book_id = b.get("id", i + 1)
+        book_rows += CATALOG_BOOK.pack(
+            book_id,
+            t_off,
+            a_off,
+            t_len,
+            a_len,
+            code,
+            flags(book_id) if flags else 0,
+        )
+        keys += (
+            f"{b['title']}\x1f{b['author']}\x1f{b['shelf']}".lower().encode("utf-8")
+            + b"\n"
+        )
+        key_offsets.append(len(keys))
+
+    body = bytearray(b"\x00" * CATALOG_HEADER.size)
+    shelves_off = len(body)
+    for (off, ln, cap), used in zip(shelf_rows, counts):
+        body += CATALOG_SHELF.pack(off, ln, cap, used)
+    records_off = len(body)
+    body += book_rows
+    offsets_off = len(body)
+    body += struct.pack(f"<{len(key_offsets)}I", *key_offsets)
+    keys_off = len(body)
+    body += keys
+    _align4(body)
+    heap_off = len(body)
+    body += heap
+
+    CATALOG_HEADER.pack_into(
+        body,
+        0,
+        CATALOG_MAGIC,
+        CATALOG_VERSION,
+        len(books),
+        len(shelves),
+        page_size,
+        shelves_off,
+        records_off,
+        offsets_off,
+        keys_off,
+        len(keys),
+        heap_off,
+    )
+    return body
+
+
+def save_catalog(path, books, capacity, page_size=CATALOG_PAGE_SIZE, flags=None):
+    body = build_catalog(books, capacity, page_size, flags)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+class CatalogView:
+    # Read-only view over a catalog image held in any buffer (mmap, shared memory).
+    def __init__(self, buf):
+        self.buf = memoryview(buf)
+        (
+            magic,
+            version,
+            self.n_records,
+            n_shelves,
+            self.page_size,
+            shelves_off,
+            self.records_off,
+            offsets_off,
+            self.keys_off,
+            keys_len,
+            self.heap_off,
+        ) = CATALOG_HEADER.unpack_from(self.buf, 0)
+        if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+            raise ValueError("Not a Smart Library catalog file.")
+
+        self.keys_end = self.keys_off + keys_len
+        offsets = self.buf[offsets_off : offsets_off + 4 * (self.n_records + 1)]
+        if sys.byteorder == "little":
+            self.key_offsets = offsets.cast("I")
+        else:
+            self.key_offsets = list(
+                struct.unpack(f"<{self.n_records + 1}I", offsets)
+            )
+
+        self.shelf_names = []
+        self.capacity = {}
+        self.counts = {}
+        for i in range(n_shelves):
+            off, ln, cap, used = CATALOG_SHELF.unpack_from(
+                self.buf, shelves_off + i * CATALOG_SHELF.size
+            )
+            name = self._text(off, ln)
+            self.shelf_names.append(name)
+            self.capacity[name] = cap
+            self.counts[name] = used
+
+    def _text(self, off, ln):
+        start = self.heap_off + off
+        return str(self.buf[start : start + ln], "utf-8")
+
+    def __len__(self):
+        return self.n_records
+
+    @property
+    def page_count(self):
+        return -(-self.n_records // self.page_size)
+
+    def record(self, i):
+        if not 0 <= i < self.n_records:
+            raise IndexError(i)
+        book_id, t_off, a_off, t_len, a_len, code, _ = CATALOG_BOOK.unpack_from(
+            self.buf, self.records_off + i * CATALOG_BOOK.size
+        )
+        return {
+            "id": book_id,
+            "title": self._text(t_off, t_len),
+            "author": self._text(a_off, a_len),
+            "shelf": self.shelf_names[code],
+        }
+
+    def book_id(self, i):
+        return struct.unpack_from(
+            "<I", self.buf, self.records_off + i * CATALOG_BOOK.size
+        )[0]
+
+    def flags(self, i):
+        # availability as of when the image was built
+        return self.buf[self.records_off + i * CATALOG_BOOK.size + 18]
+
+    def status(self, i):
+        flags = self.flags(i)
+        if flags & BOOK_OVERDUE:
+            return "Overdue"
+        if flags & BOOK_ON_LOAN:
+            return "Checked out"
+        return "On shelf"
+
+    def page_range(self, page):
+        start = page * self.page_size
+        return range(start, min(start + self.page_size, self.n_records))
+
+    def page(self, page):
+        return [self.record(i) for i in self.page_range(page)]
+
+    def search(self, q, on_shelf_only=False):
+        # yields record indices whose title/author/shelf contains q; with
+        # on_shelf_only, books flagged as on loan are skipped (and an empty q
+        # lists every book on the shelf)
+        needle = q.lower().encode("utf-8")
+        if not needle and on_shelf_only:
+            for i in range(self.n_records):
+                if not self.flags(i) & BOOK_ON_LOAN:
+                    yield i
+            return
+        if not needle or b"\n" in needle or b"\x1f" in needle:
+            return
+        pattern = re.compile(re.escape(needle))
+        pos = self.keys_off
+        while True:
+            m = pattern.search(self.buf, pos, self.keys_end)
+            if m is None:
+                return
+            idx = bisect_right(self.key_offsets, m.start() - self.keys_off) - 1
+            if not (on_shelf_only and self.flags(idx) & BOOK_ON_LOAN):
+                yield idx
+            pos = self.keys_off + self.key_offsets[idx + 1]
+
+    def close(self):
+        if isinstance(self.key_offsets, memoryview):
+            self.key_offsets.release()
+        self.buf.release()
+
+
+class MappedCatalog(CatalogView):
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = None
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            super().__init__(self._mm)
+        except Exception:
+            if self._mm is not None:
+                self._mm.close()
+            self._file.close()
+            raise
+
+    def close(self):
+        super().close()
+        self._mm.close()
+        self._file.close()
+
+
+# ================== SHARED-MEMORY SNAPSHOT ================== #
+# A small control segment "<name>-ctl" holds a generation counter and the name
+# of the segment with the current catalog image (same layout as the binary
+# catalog file). The counter is odd while the publisher is switching, so
+# readers retry instead of picking up a half-written name.
+SNAPSHOT_CONTROL = struct.Struct("<Q64s")
+
+
+def _attach_shm(name):
+    # attach without letting this process's resource tracker unlink the
+    # segment when the reader exits
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix":
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class SnapshotPublisher:
+    def __init__(self, name="smartlib"):
+        self.name = name
+        try:
+            self.control = shared_memory.SharedMemory(
+                name=f"{name}-ctl", create=True, size=SNAPSHOT_CONTROL.size
+            )
+            SNAPSHOT_CONTROL.pack_into(self.control.buf, 0, 0, b"")
+        except FileExistsError:
+            self.control = shared_memory.SharedMemory(name=f"{name}-ctl")
+        self.generation = SNAPSHOT_CONTROL.unpack_from(self.control.buf, 0)[0]
+        self.segments = []
+
+    def publish(self, image):
+        image = memoryview(image)
+        gen = self.generation + 2
+        seg = shared_memory.SharedMemory(
+            name=f"{self.name}-g{gen}", create=True, size=max(len(image), 1)
+        )
+        seg.buf[: len(image)] = image
+        image.release()
+
+        SNAPSHOT_CONTROL.pack_into(self.control.buf, 0, gen - 1, b"")
+        SNAPSHOT_CONTROL.pack_into(
+            self.control.buf, 0, gen - 1, seg.name.lstrip("/").encode("ascii")
+        )
+        SNAPSHOT_CONTROL.pack_into(
+            self.control.buf, 0, gen, seg.name.lstrip("/").encode("ascii")
+        )
+        self.generation = gen
+
+        # readers still attached to older snapshots keep their mapping; keep
+        # the previous one around so a reader mid-switch can still open it
+        self.segments.append(seg)
+        while len(self.segments) > 2:
+            old = self.segments.pop(0)
+            old.close()
+            old.unlink()
+        return gen
+
+    def close(self):
+        for seg in self.segments:
+            seg.close()
+            seg.unlink()
+        self.segments = []
+        self.control.close()
+        self.control.unlink()
+
+
+class SnapshotReader:
+    def __init__(self, name="smartlib"):
+        self.name = name
+        self.control = None
+        self.generation = 0
+        self.segment = None
+        self.view = None
+        self.attach()
+
+    def attach(self):
+        # the publisher may not be running yet; refresh() keeps retrying
+        if self.control is None:
+            try:
+                self.control = _attach_shm(f"{self.name}-ctl")
+            except FileNotFoundError:
+                return False
+        return True
+
+    def current(self):
+        # consistent (generation, segment name) pair from the control block
+        while True:
+            gen, raw = SNAPSHOT_CONTROL.unpack_from(self.control.buf, 0)
+            if gen % 2 == 0:
+                again = SNAPSHOT_CONTROL.unpack_from(self.control.buf, 0)[0]
+                if again == gen:
+                    return gen, raw.rstrip(b"\x00").decode("ascii")
+            time.sleep(0)
+
+    def refresh(self):
+        # switch to the newest snapshot; True if the view changed
+        if not self.attach():
+            return False
+        gen, seg_name = self.current()
+        if gen == self.generation or not seg_name:
+            return False
+        try:
+            segment = _attach_shm(seg_name)
+        except FileNotFoundError:
+            return False  # superseded while we looked; next poll catches up
+        old_view, old_segment = self.view, self.segment
+        self.segment = segment
+        self.view = CatalogView(segment.buf)
+        self.generation = gen
+        if old_view is not None:
+            old_view.close()
+            old_segment.close()
+        return True
+
+    def close(self):
+        if self.view is not None:
+            self.view.close()
+            self.segment.close()
+        if self.control is not None:
+            self.control.close()
+
+
+# ================== SHELF ANALYTICS ================== #
+SECONDS_PER_DAY = 86400
+
+
+class ShelfAnalytics:
+    # Shelf occupancy kept as NumPy vectors: one shelf code per book, counts
+    # from bincount, and every ratio/forecast computed over all shelves at once.
+    def __init__(self, capacity):
+        if np is None:
+            raise RuntimeError("Shelf analytics need NumPy (pip install numpy).")
+        self.shelves = list(capacity.keys())
+        self.codes = {name: i for i, name in enumerate(self.shelves)}
+        self.capacity = np.array(
+            [capacity[name] for name in self.shelves], dtype=np.int64
+        )
+        self.shelf_codes = np.zeros(0, dtype=np.int32)
+        self.add_times = []
+        self.add_codes = []
+
+    def _code(self, shelf):
+        if shelf not in self.codes:
+            self.codes[shelf] = len(self.shelves)
+            self.shelves.append(shelf)
+            self.capacity = np.append(self.capacity, 0)
+        return self.codes[shelf]
+
+    def set_capacity(self, capacity):
+        for name in capacity:
+            self._code(name)
+        self.capacity = np.array(
+            [capacity.get(name, 0) for name in self.shelves], dtype=np.int64
+        )
+
+    def load_books(self, books):
+        self.shelf_codes = np.fromiter(
+            (self._code(b["shelf"]) for b in books), dtype=np.int32, count=len(books)
+        )
+
+    def load_catalog(self, view):
+        # shelf codes straight out of the record table, no per-book decoding
+        for name in view.shelf_names:
+            self._code(name)
+        remap = np.array([self.codes[n] for n in view.shelf_names], dtype=np.int32)
+        rows = np.frombuffer(
+            view.buf,
+            dtype=np.dtype(
+                [
+                    ("id", "<u4"),
+                    ("title_off", "<u4"),
+                    ("author_off", "<u4"),
+                    ("title_len", "<u2"),
+                    ("author_len", "<u2"),
+                    ("shelf", "<u2"),
+                    ("flags", "u1"),
+                    ("pad", "V1"),
+                ]
+            ),
+            count=len(view),
+            offset=view.records_off,
+        )
+        # fancy indexing copies, so the mapped buffer is not kept alive
+        if len(remap):
+            self.shelf_codes = remap[rows["shelf"]]
+        else:
+            self.shelf_codes = np.zeros(0, dtype=np.int32)
+
+    def record_add(self, shelf, when=None):
+        self.add_times.append(time.time() if when is None else when)
+        self.add_codes.append(self._code(shelf))
+
+    def save_history(self, path, keep_days=365, now=None):
+        # add history feeds fill_rates(); only the recent part is worth keeping
+        cutoff = (time.time() if now is None else now) - keep_days * SECONDS_PER_DAY
+        adds = [
+            [t, self.shelves[c]]
+            for t, c in zip(self.add_times, self.add_codes)
+            if t >= cutoff
+        ]
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(adds, f)
+        os.replace(tmp, path)
+
+    def load_history(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                adds = json.load(f)
+        except FileNotFoundError:
+            return
+        for t, shelf in adds:
+            self.record_add(shelf, t)
+
+    def occupancy(self):
+        return np.bincount(self.shelf_codes, minlength=len(self.shelves))
+
+    def ratios(self):
+        used = self.occupancy()
+        cap = self.capacity
+        return np.divide(
+            used, cap, out=np.where(used > 0, np.inf, 0.0), where=cap > 0
+        )
+
+    def histogram(self, bins=10):
+        # utilization histogram; over-full shelves land in the last bucket
+        return np.histogram(np.clip(self.ratios(), 0, 1), bins=bins, range=(0, 1))
+
+    def fill_rates(self, window_days=30, now=None):
+        now = time.time() if now is None else now
+        times = np.asarray(self.add_times, dtype=np.float64)
+        codes = np.asarray(self.add_codes, dtype=np.int32)
+        recent = codes[times >= now - window_days * SECONDS_PER_DAY]
+        return np.bincount(recent, minlength=len(self.shelves)) / window_days
+
+    def days_until_full(self, window_days=30, now=None):
+        free = np.maximum(self.capacity - self.occupancy(), 0).astype(np.float64)
+        rate = self.fill_rates(window_days, now)
+        return np.divide(free, rate, out=np.full(len(free), np.inf), where=rate > 0)
+
+    def rebalance_suggestions(self, high=0.9, low=0.6):
+        # move books off shelves above `high` onto shelves below `low`
+        used = self.occupancy()
+        cap = self.capacity
+        excess = np.maximum(used - np.floor(cap * high), 0).astype(np.int64)
+        room = np.maximum(np.floor(cap * low) - used, 0).astype(np.int64)
+        givers = np.argsort(-excess, kind="stable")
+        givers = givers[excess[givers] > 0]
+        takers = np.argsort(-room, kind="stable")
+        takers = takers[room[takers] > 0]
+        if not len(givers) or not len(takers):
+            return []
+        # Greedy fill (largest excess into largest room) as interval matching:
+        # lay the excess and the room out on one line each; every overlap of a
+        # giver's span with a taker's span is one move.
+        give_end = np.cumsum(excess[givers])
+        take_end = np.cumsum(room[takers])
+        total = min(give_end[-1], take_end[-1])
+        ends = np.union1d(give_end, take_end)
+        ends = ends[ends <= total]
+        starts = np.concatenate(([0], ends[:-1]))
+        g = givers[np.searchsorted(give_end, starts, side="right")]
+        t = takers[np.searchsorted(take_end, starts, side="right")]
+        return [
+            (self.shelves[a], self.shelves[b], int(n))
+            for a, b, n in zip(g, t, ends - starts)
+        ]
+
+    def report_rows(self, window_days=30):
+        # one tuple per shelf, in SHELF_FIELDS order
+        used = self.occupancy()
+        ratios = self.ratios()
+        rates = self.fill_rates(window_days)
+        days = self.days_until_full(window_days)
+        for i, shelf in enumerate(self.shelves):
+            yield (
+                shelf,
+                int(used[i]),
+                int(self.capacity[i]),
+                int(max(self.capacity[i] - used[i], 0)),
+                "" if np.isinf(ratios[i]) else round(float(ratios[i]), 4),
+                round(float(rates[i]), 4),
+                "" if np.isinf(days[i]) else round(float(days[i]), 1),
+            )
+
+    def summary_rows(self):
+        # utilization histogram and rebalance suggestions, after the shelf table
+        counts, edges = self.histogram()
+        yield ()
+        yield ("utilization_bucket", "shelves")
+        for lo, hi, n in zip(edges[:-1], edges[1:], counts):
+            yield (f"{lo:.1f}-{hi:.1f}", int(n))
+        moves = self.rebalance_suggestions()
+        if moves:
+            yield ()
+            yield ("move_from", "move_to", "books")
+            yield from moves
+
+    def write_report(self, path, window_days=30):
+        rows = itertools.chain(self.report_rows(window_days), self.summary_rows())
+        return ExportJob(rows, SHELF_FIELDS, path, fmt="csv").run()
+
+
+# ================== ROUTE TELEMETRY ================== #
+class RouteTelemetry:
+    # Route lookups go into per-edge (and per-tag) counters for the current
+    # window; every `rollup_secs` the window is folded into the running totals
+    # (older traffic decays by `decay`). Recording a route only touches its
+    # own edges, so cost does not grow with history.
+    def __init__(self, rollup_secs=300, decay=0.9):
+        self.rollup_secs = rollup_secs
+        self.decay = decay
+        self.last_rollup = time.time()
+        self.window_edges = defaultdict(int)
+        self.window_tags = defaultdict(int)
+        self.edge_totals = defaultdict(float)
+        self.tag_totals = defaultdict(float)
+
+    def record(self, path, tag=None, now=None):
+        now = time.time() if now is None else now
+        if now - self.last_rollup >= self.rollup_secs:
+            self.rollup(now)
+        for a, b in zip(path, path[1:]):
+            self.window_edges[aisle(a, b)] += 1
+        if tag is not None:
+            self.window_tags[tag] += 1
+
+    def rollup(self, now=None):
+        for totals, window in (
+            (self.edge_totals, self.window_edges),
+            (self.tag_totals, self.window_tags),
+        ):
+            for key in totals:
+                totals[key] *= self.decay
+            for key, n in window.items():
+                totals[key] += n
+            window.clear()
+        self.last_rollup = time.time() if now is None else now
+
+    def edge_heat(self):
+        heat = defaultdict(float, self.edge_totals)
+        for key, n in self.window_edges.items():
+            heat[key] += n
+        return heat
+
+    def tag_heat(self):
+        heat = defaultdict(float, self.tag_totals)
+        for key, n in self.window_tags.items():
+            heat[key] += n
+        return heat
+
+
+TELEMETRY = RouteTelemetry()
+
+
+# ================== SHELF PLACEMENT ================== #
+def route_order(graph, start, cost=edge_cost):
+    # (node, distance) in order of route distance from start (Dijkstra, lazily,
+    # so callers can stop early); closed aisles are never crossed
+    dist = {start: 0}
+    done = set()
+    heap = [(0, start)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        yield node, d
+        for nxt in graph.get(node, ()):
+            nd = d + cost(node, nxt)
+            if nd < dist.get(nxt, INF):
+                dist[nxt] = nd
+                heapq.heappush(heap, (nd, nxt))
+
+
+class ShelfPlacer:
+    # Suggests shelves by route distance over GRAPH (current aisle costs, see
+    # edge_cost) and plans bulk rebalancing. Occupancy is kept as a dict of
+    # counts and updated per add/move/remove.
+    def __init__(self, graph, capacity, entrance="Entrance", cost=edge_cost):
+        self.graph = graph
+        self.capacity = capacity
+        self.entrance = entrance
+        self.cost = cost
+        self.used = defaultdict(int)
+
+    def set_counts(self, counts):
+        self.used = defaultdict(int, counts)
+
+    def add(self, shelf):
+        self.used[shelf] += 1
+
+    def remove(self, shelf):
+        self.used[shelf] -= 1
+
+    def move(self, old, new):
+        if old != new:
+            self.used[old] -= 1
+            self.used[new] += 1
+
+    def free(self, shelf):
+        return self.capacity.get(shelf, 0) - self.used[shelf]
+
+    def nearest_free(self, shelf, need=1):
+        # closest shelf to `shelf` (by route distance) with room for `need` books
+        for node, _ in route_order(self.graph, shelf, self.cost):
+            if node in self.capacity and self.free(node) >= need:
+                return node
+        return None
+
+    def shelf_order(self):
+        # shelves reachable from the entrance, nearest first
+        return [
+            node
+            for node, _ in route_order(self.graph, self.entrance, self.cost)
+            if node in self.capacity
+        ]
+
+    def plan_rebalance(self, books, weights=None, scan=64):
+        # Keep each author's books together and put the most requested groups
+        # on the shelves nearest the entrance. Returns [(index, old, new)].
+        if len(books) > sum(self.capacity.values()):
+            raise ValueError("Not enough shelf capacity to rebalance all books.")
+        groups = defaultdict(list)
+        for i, b in enumerate(books):
+            groups[b["author"]].append(i)
+
+        def demand(author):
+            w = weights.get(author, 0) if weights else 0
+            return (w, len(groups[author]))
+
+        shelves = self.shelf_order()
+        room = [self.capacity[s] for s in shelves]
+        first_open = 0
+        target = {}
+
+        for author in sorted(groups, key=demand, reverse=True):
+            members = groups[author]
+            while first_open < len(shelves) and room[first_open] <= 0:
+                first_open += 1
+            if first_open == len(shelves):
+                break
+
+            # whole group on the nearest shelf that can hold it, if close by
+            home = None
+            for j in range(first_open, min(first_open + scan, len(shelves))):
+                if room[j] >= len(members):
+                    home = j
+                    break
+            if home is not None:
+                room[home] -= len(members)
+                for i in members:
+                    target[i] = shelves[home]
+                continue
+
+            # otherwise spill over consecutive shelves, starting nearest
+            j = first_open
+            for i in members:
+                while j < len(shelves) and room[j] <= 0:
+                    j += 1
+                if j == len(shelves):
+                    break
+                room[j] -= 1
+                target[i] = shelves[j]
+
+        # books whose group is already split the same way do not need to move
+        moves = []
+        for author, members in groups.items():
+            wanted = defaultdict(int)
+            for i in members:
+                if i in target:
+                    wanted[target[i]] += 1
+            stay, go = [], []
+            for i in members:
+                shelf = books[i]["shelf"]
+                if wanted[shelf] > 0:
+                    wanted[shelf] -= 1
+                    stay.append(i)
+                else:
+                    go.append(i)
+            slots = [shelf for shelf, n in wanted.items() for _ in range(n)]
+            for i, shelf in zip(go, slots):
+                moves.append((i, books[i]["shelf"], shelf))
+        return moves
+
+
+# ================== CIRCULATION ================== #
+class CirculationError(Exception):
+    pass
+
+
+class Circulation:
+    # Loans keyed by book id double as the availability index (a book is on
+    # the shelf iff its id is not in `loans`). Due dates sit in a min-heap;
+    # check-ins leave stale heap entries that the overdue scan skips, so a
+    # scan only pops the k entries that are actually due: O(k log n).
+    def __init__(self, loan_days=14):
+        self.loan_days = loan_days
+        self.loans = {}  # book id -> (patron, due)
+        self.holds = defaultdict(deque)  # title -> patrons waiting
+        self.due_heap = []
+        self.overdue = {}  # book id -> due, for loans already reported
+
+    @staticmethod
+    def title_key(title):
+        return title.strip().lower()
+
+    def available(self, book_id):
+        return book_id not in self.loans
+
+    def check_out(self, book, patron, now=None):
+        if book["id"] in self.loans:
+            raise CirculationError(f"'{book['title']}' is already checked out.")
+        queue = self.holds.get(self.title_key(book["title"]))
+        if queue:
+            if queue[0] != patron:
+                raise CirculationError(
+                    f"'{book['title']}' is on hold for {queue[0]} "
+                    f"({len(queue)} waiting)."
+                )
+            queue.popleft()
+        now = time.time() if now is None else now
+        due = now + self.loan_days * SECONDS_PER_DAY
+        self.loans[book["id"]] = (patron, due)
+        heapq.heappush(self.due_heap, (due, book["id"]))
+        return due
+
+    def check_in(self, book):
+        # returns the next patron waiting for this title, if any
+        if self.loans.pop(book["id"], None) is None:
+            raise CirculationError(f"'{book['title']}' is not checked out.")
+        self.overdue.pop(book["id"], None)
+        queue = self.holds.get(self.title_key(book["title"]))
+        return queue[0] if queue else None
+
+    def place_hold(self, title, patron):
+        queue = self.holds[self.title_key(title)]
+        if patron in queue:
+            raise CirculationError(f"{patron} already has a hold on '{title}'.")
+        queue.append(patron)
+        return len(queue)
+
+    def scan_overdue(self, now=None):
+        # newly overdue (book id, patron, due) since the last scan
+        now = time.time() if now is None else now
+        found = []
+        while self.due_heap and self.due_heap[0][0] <= now:
+            due, book_id = heapq.heappop(self.due_heap)
+            loan = self.loans.get(book_id)
+            if loan is None or loan[1] != due:
+                continue  # returned (or re-lent) since this entry was pushed
+            self.overdue[book_id] = due
+            found.append((book_id, loan[0], due))
+        return found
+
+    def flags(self, book_id):
+        if book_id in self.overdue:
+            return BOOK_ON_LOAN | BOOK_OVERDUE
+        return BOOK_ON_LOAN if book_id in self.loans else 0
+
+    def save(self, path):
+        # loans and holds; the due heap and overdue set are rebuilt on load
+        data = {
+            "loans": [[i, patron, due] for i, (patron, due) in self.loans.items()],
+            "holds": {title: list(q) for title, q in self.holds.items() if q},
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        self.loans = {i: (patron, due) for i, patron, due in data["loans"]}
+        self.holds = defaultdict(
+            deque, {title: deque(q) for title, q in data["holds"].items()}
+        )
+        self.due_heap = [(due, i) for i, (_, due) in self.loans.items()]
+        heapq.heapify(self.due_heap)
+        self.overdue = {}
+
+    def status(self, book_id):
+        loan = self.loans.get(book_id)
+        if loan is None:
+            return "On shelf"
+        if book_id in self.overdue:
+            return f"Overdue ({loan[0]})"
+        return f"Due {time.strftime('%Y-%m-%d', time.localtime(loan[1]))}"
+
+
+CIRCULATION = Circulation()
+OVERDUE_SCAN_MS = 60_000
+
+
+# ================== SHARDED SEARCH ================== #
+SEARCH_LIMIT = 500
+
+
+def search_score(q, title, author, shelf):
+    # higher is better; 0 means no match (all arguments lowercase)
+    if title == q:
+        return 100
+    if title.startswith(q):
+        return 80
+    if q in title:
+        return 60
+    if author.startswith(q):
+        return 50
+    if q in author:
+        return 40
+    if q in shelf:
+        return 20
+    return 0
+
+
+class ShardIndex:
+    # One worker's slice of the catalog with lowercase keys prepared up front.
+    def __init__(self, books=(), loaned=()):
+        self.rows = {}
+        self.loaned = set(loaned)
+        for b in books:
+            self.put(b)
+
+    def put(self, book, loaned=None):
+        if loaned is not None:
+            self.set_loaned(book["id"], loaned)
+        title, author, shelf = (
+            book["title"].lower(),
+            book["author"].lower(),
+            book["shelf"].lower(),
+        )
+        self.rows[book["id"]] = (
+            f"{title}\x1f{author}\x1f{shelf}",
+            title,
+            author,
+            shelf,
+            {k: book[k] for k in ("id", "title", "author", "shelf")},
+        )
+
+    def remove(self, book_id):
+        self.rows.pop(book_id, None)
+        self.loaned.discard(book_id)
+
+    def set_loaned(self, book_id, loaned):
+        if loaned:
+            self.loaned.add(book_id)
+        else:
+            self.loaned.discard(book_id)
+
+    def search(self, q, k, on_shelf_only=False):
+        # (matches, top-k [(score, -id, book)]); loaned books are dropped
+        # before the top-k cut so they don't use up result slots
+        skip = self.loaned if on_shelf_only else ()
+        hits = []
+        for book_id, (key, title, author, shelf, book) in self.rows.items():
+            if q in key and book_id not in skip:
+                score = search_score(q, title, author, shelf)
+                if score:
+                    hits.append((score, -book_id, book))
+        return len(hits), heapq.nlargest(k, hits, key=lambda h: h[:2])
+
+
+def _shard_worker(conn, books, loaned):
+    index = ShardIndex(books, loaned)
+    while True:
+        op, *args = conn.recv()
+        if op == "search":
+            conn.send(index.search(*args))
+        elif op == "put":
+            index.put(*args)
+        elif op == "remove":
+            index.remove(*args)
+        elif op == "loan":
+            index.set_loaned(*args)
+        elif op == "stop":
+            break
+    conn.close()
+
+
+class ShardedSearch:
+    # Catalog split across worker processes (by shelf or by book id), each
+    # with its own ShardIndex. A query is sent to every shard before any reply
+    # is read, so shards scan in parallel; the partial top-k lists are merged.
+    # If a worker dies, search() raises EOFError and the pool must be rebuilt.
+    def __init__(self, books, workers=None, by="hash", loaned=()):
+        self.n = max(1, workers or os.cpu_count() or 1)
+        self.by = by
+        self.loaned = set()
+        self.broken = False
+        shards = [[] for _ in range(self.n)]
+        shard_loans = [[] for _ in range(self.n)]
+        for b in books:
+            i = self.shard_of(b)
+            shards[i].append({k: b[k] for k in ("id", "title", "author", "shelf")})
+            if b["id"] in loaned:
+                shard_loans[i].append(b["id"])
+                self.loaned.add(b["id"])
+        ctx = multiprocessing.get_context()
+        self.conns = []
+        self.procs = []
+        for shard, shard_loaned in zip(shards, shard_loans):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(
+                target=_shard_worker, args=(child, shard, shard_loaned), daemon=True
+            )
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+
+    def shard_of(self, book):
+        if self.by == "shelf":
+            return zlib.crc32(book["shelf"].encode("utf-8")) % self.n
+        return book["id"] % self.n
+
+    def _send(self, i, msg):
+        try:
+            self.conns[i].send(msg)
+        except OSError:
+            self.broken = True  # reported by the next search()
+
+    def search(self, q, k=SEARCH_LIMIT, on_shelf_only=False):
+        if self.broken:
+            raise EOFError("a search worker has stopped")
+        q = q.lower()
+        total = 0
+        parts = []
+        try:
+            for conn in self.conns:
+                conn.send(("search", q, k, on_shelf_only))
+            for conn in self.conns:
+                matches, top = conn.recv()
+                total += matches
+                parts.append(top)
+        except (EOFError, OSError):
+            self.broken = True
+            raise EOFError("a search worker has stopped") from None
+        merged = heapq.merge(*parts, key=lambda h: h[:2], reverse=True)
+        return total, [book for _, _, book in itertools.islice(merged, k)]
+
+    def add(self, book):
+        # the loaned flag travels with the book in case it changed shards
+        loaned = book["id"] in self.loaned
+        self._send(self.shard_of(book), ("put", book, loaned))
+
+    def update(self, book, old_shelf):
+        if self.by == "shelf" and old_shelf != book["shelf"]:
+            old = self.shard_of({"shelf": old_shelf})
+            self._send(old, ("remove", book["id"]))
+        self.add(book)
+
+    def remove(self, book):
+        self.loaned.discard(book["id"])
+        self._send(self.shard_of(book), ("remove", book["id"]))
+
+    def set_loaned(self, book, loaned):
+        if loaned:
+            self.loaned.add(book["id"])
+        else:
+            self.loaned.discard(book["id"])
+        self._send(self.shard_of(book), ("loan", book["id"], loaned))
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(("stop",))
+                conn.close()
+            except OSError:
+                pass
+        for proc in self.procs:
+            proc.join(timeout=1)
+
+
+# ================== STREAMING EXPORT ================== #
+EXPORT_CHUNK_ROWS = 5000
+INVENTORY_FIELDS = ("title", "author", "shelf", "status")
+SHELF_FIELDS = (
+    "shelf",
+    "used",
+    "capacity",
+    "free",
+    "utilization",
+    "adds_per_day",
+    "days_until_full",
+)
+ROUTE_FIELDS = ("shelf", "steps", "path")
+
+
+def inventory_rows(catalog=None):
+    # reads the mapped catalog page by page, or BOOKS by index, so nothing
+    # is copied up front
+    if catalog is not None:
+        for i in range(len(catalog)):
+            b = catalog.record(i)
+            yield (b["title"], b["author"], b["shelf"], "On shelf")
+        return
+    i = 0
+    while i < len(BOOKS):
+        b = BOOKS[i]
+        yield (b["title"], b["author"], b["shelf"], CIRCULATION.status(b["id"]))
+        i += 1
+
+
+def shelf_rows(counts):
+    # same columns as ShelfAnalytics.report_rows, without the fill forecast
+    for shelf, cap in SHELF_CAPACITY.items():
+        used = counts(shelf)
+        ratio = round(used / cap, 4) if cap else ""
+        yield (shelf, used, cap, max(cap - used, 0), ratio, "", "")
+
+
+def route_rows(start="Entrance"):
+    for shelf in SHELF_CAPACITY:
+        path = ROUTES.route(start, shelf)
+        if path is None:
+            yield (shelf, "", "")
+        else:
+            yield (shelf, len(path) - 1, " > ".join(path))
+
+
+class ExportWriter:
+    # File I/O (and gzip) runs on a background thread fed through a bounded
+    # queue, so at most `max_pending` encoded chunks are ever held in memory.
+    def __init__(self, path, compress=False, max_pending=8):
+        self.chunks = queue.Queue(maxsize=max_pending)
+        self.error = None
+        if compress:
+            self.file = gzip.open(path, "wb", compresslevel=6)
+        else:
+            self.file = open(path, "wb")
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self):
+        try:
+            while True:
+                chunk = self.chunks.get()
+                if chunk is None:
+                    break
+                self.file.write(chunk)
+        except Exception as e:  # reported by close()
+            self.error = e
+            while self.chunks.get() is not None:
+                pass
+        finally:
+            self.file.close()
+
+    def full(self):
+        return self.chunks.full()
+
+    def write(self, chunk):
+        self.chunks.put(chunk)
+
+    def close(self):
+        self.chunks.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class ExportJob:
+    # Turns a row generator into CSV or JSONL chunks. step() encodes one chunk
+    # and returns False once everything is written; the UI calls it from
+    # after() ticks, scripts can just call run().
+    def __init__(self, rows, fields, path, fmt=None, compress=None, chunk_rows=None):
+        base = path[:-3] if path.endswith(".gz") else path
+        self.fmt = fmt or ("jsonl" if base.endswith((".jsonl", ".json")) else "csv")
+        self.compress = path.endswith(".gz") if compress is None else compress
+        self.path = path
+        self.rows = iter(rows)
+        self.fields = fields
+        self.chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+        self.written = 0
+        self.writer = ExportWriter(path, compress=self.compress)
+        if self.fmt == "csv":
+            self.writer.write(self._csv([fields]))
+
+    def _csv(self, rows):
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(rows)
+        return buf.getvalue().encode("utf-8")
+
+    def _jsonl(self, rows):
+        return "".join(
+            json.dumps(dict(zip(self.fields, row)), ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+    def step(self):
+        batch = list(itertools.islice(self.rows, self.chunk_rows))
+        if batch:
+            encode = self._csv if self.fmt == "csv" else self._jsonl
+            self.writer.write(encode(batch))
+            self.written += len(batch)
+        if len(batch) < self.chunk_rows:
+            self.writer.close()
+            return False
+        return True
+
+    def abort(self):
+        self.rows = iter(())
+        try:
+            self.writer.close()
+        except OSError:
+            pass
+
+    def run(self):
+        while self.step():
+            pass
+        return self.written
+
+
+# ================== SHELF BARS ================== #
+class ShelfBars:
+    # Shelf usage bars on a canvas. Items are created once per visible row and
+    # reused while scrolling; update() only records what changed and the actual
+    # repaint happens at most once per frame.
+    ROW = 16
+    LABEL = 28
+    FRAME_MS = 16
+
+    def __init__(self, parent, width=220, height=90, bg="white", fill="#a7f3d0"):
+        self.frame = tk.Frame(parent, bg=bg)
+        self.canvas = tk.Canvas(
+            self.frame, width=width, height=height, bg=bg, highlightthickness=0
+        )
+        self.scroll = tk.Scrollbar(
+            self.frame, orient="vertical", command=self.canvas.yview, width=8
+        )
+        self.canvas.configure(yscrollcommand=self.on_scroll)
+        self.canvas.pack(side="left")
+        self.scroll.pack(side="left", fill="y")
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+        self.canvas.configure(yscrollincrement=self.ROW)
+
+        self.height = height
+        self.bar_width = width - self.LABEL - 12
+        self.fill = fill
+        self.order = []  # shelves, in display order
+        self.row_of = {}  # shelf -> row index
+        self.values = {}  # shelf -> (used, cap)
+        self.dirty = set()
+        self.slots = []  # [row, text, track, bar] per pooled row
+        self.job = None
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    def update(self, per_shelf):
+        order = [shelf for shelf, _, _ in per_shelf]
+        if order != self.order:
+            self.order = order
+            self.row_of = {shelf: i for i, shelf in enumerate(order)}
+            self.values = {}
+            for slot in self.slots:
+                slot[0] = None
+            self.canvas.configure(
+                scrollregion=(0, 0, 0, max(len(order) * self.ROW + 4, self.height))
+            )
+        for shelf, used, cap in per_shelf:
+            if self.values.get(shelf) != (used, cap):
+                self.values[shelf] = (used, cap)
+                self.dirty.add(shelf)
+        if self.dirty:
+            self.schedule()
+
+    def schedule(self):
+        if self.job is None:
+            self.job = self.canvas.after(self.FRAME_MS, self.paint)
+
+    def on_scroll(self, first, last):
+        self.scroll.set(first, last)
+        self.schedule()
+
+    def on_wheel(self, event):
+        self.canvas.yview_scroll(-1 if event.delta > 0 else 1, "units")
+
+    def visible_rows(self):
+        top = int(self.canvas.canvasy(0)) // self.ROW
+        count = self.height // self.ROW + 2
+        return range(max(top, 0), min(top + count, len(self.order)))
+
+    def paint(self):
+        self.job = None
+        rows = self.visible_rows()
+        while len(self.slots) < len(rows):
+            c = self.canvas
+            self.slots.append(
+                [
+                    None,
+                    c.create_text(0, 0, anchor="w", font=("Segoe UI", 8)),
+                    c.create_rectangle(0, 0, 0, 0, outline="#d1d5db", fill="#f3f4f6"),
+                    c.create_rectangle(0, 0, 0, 0, outline="", fill=self.fill),
+                ]
+            )
+        n = len(self.slots)
+        for i in rows:
+            slot = self.slots[i % n]
+            shelf = self.order[i]
+            if slot[0] != i or shelf in self.dirty:
+                self.draw(slot, i, shelf)
+        shown = {i % n for i in rows}
+        for k, slot in enumerate(self.slots):
+            if k not in shown and slot[0] is not None:
+                slot[0] = None
+                for item in slot[1:]:
+                    self.canvas.itemconfigure(item, state="hidden")
+        # off-screen shelves are drawn when they scroll into view
+        self.dirty.clear()
+
+    def draw(self, slot, i, shelf):
+        c = self.canvas
+        used, cap = self.values[shelf]
+        x0 = 6 + self.LABEL
+        y = 8 + i * self.ROW
+        w = 0 if cap == 0 else int(self.bar_width * min(used / cap, 1))
+        if slot[0] != i:
+            slot[0] = i
+            c.coords(slot[1], 6, y)
+            c.itemconfigure(slot[1], text=shelf.replace("Shelf-", "S-"))
+            c.coords(slot[2], x0, y - 5, x0 + self.bar_width, y + 5)
+            c.itemconfigure(slot[1], state="normal")
+            c.itemconfigure(slot[2], state="normal")
+        c.coords(slot[3], x0, y - 5, x0 + w, y + 5)
+        c.itemconfigure(slot[3], state="normal" if w > 0 else "hidden")
+
+
 class SmartUI:
-    def __init__(self, root):
+    def __init__(
+        self,
+        root,
+        catalog_path=None,
+        search_workers=0,
+        snapshot=None,
+        publish=None,
+        timeline=False,
+    ):
         self.root = root
         root.title("Smart Library System · Ultra Modern UI")
         root.configure(bg="#f2faf7")
         root.geometry("1100x550")
 
         self.edit_index = None
+        self.edit_id = None
+        self.edit_version = 0
+
+        # binary catalog: rows are read straight from the mapped file until
+        # the first edit, then the whole catalog is loaded into BOOKS
+        self.catalog_path = catalog_path
+        self.catalog = None
+        self.catalog_dirty = False
+        self.catalog_next_page = 0
+        self.catalog_hits = None  # record indices of a search, paged the same way
+        if catalog_path and os.path.exists(catalog_path):
+            self.catalog = MappedCatalog(catalog_path)
+            CATALOG.load([])
+            SHELF_CAPACITY.update(self.catalog.capacity)
+        elif catalog_path:
+            self.catalog_dirty = True
+        root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # kiosk mode: read-only catalog attached from a shared-memory snapshot
+        self.snapshot = None
+        self.read_only = False
+        if snapshot:
+            self.snapshot = SnapshotReader(snapshot)
+            self.snapshot.refresh()
+            self.catalog = self.snapshot.view
+            self.read_only = True
+            CATALOG.load([])
+            if self.catalog is not None:
+                SHELF_CAPACITY.update(self.catalog.capacity)
+        self.publisher = SnapshotPublisher(publish) if publish else None
+        self.publish_job = None
+        self.publish_busy = False
+        self.publish_again = False
+
+        # worker processes for search are started on the first query
+        self.search_workers = search_workers
+        self.sharded = None
+
+        self.analytics = ShelfAnalytics(SHELF_CAPACITY) if np is not None else None
+        if self.analytics is not None and catalog_path and not snapshot:
+            self.analytics.load_history(catalog_path + ".adds.json")
+        if catalog_path and not snapshot:
+            CIRCULATION.load(catalog_path + ".loans.json")
+        self.placer = ShelfPlacer(GRAPH, SHELF_CAPACITY)
+        self.show_heat = tk.BooleanVar(value=False)
+        self.aisle_choice = tk.StringVar()
+        self.last_route_shelf = None
+        self.cart_paths = {}
+        self.cart_job = None
+        self.export_job = None
+        self.export_name = None
+        self.dev_win = None
+        self.timeline = timeline
 
         self.bg_main = "#f2faf7"
         self.bg_card = "#ffffff"
@@ -112,8 +2176,48 @@ class SmartUI:
         self.init_style()
         self.build_header()
         self.build_layout()
-        self.refresh_books()
-        self.update_stats()
+        STARTUP.mark("window shell built")
+
+        # staged startup: let the empty shell paint first, then fill in one
+        # stage per tick so the window never sits blank while the catalog loads
+        self.set_status("Loading catalog…")
+        self.startup_stages = deque(
+            [
+                ("table and stats", self.refresh_books),
+                ("map", self.draw_map),
+                ("background jobs", self.start_background_jobs),
+            ]
+        )
+        self.root.bind("<Map>", self.first_paint)
+
+    def first_paint(self, event):
+        # <Map> on the toplevel (children report theirs through it too); flush
+        # the pending redraws so the mark is taken once the shell is on screen
+        if event.widget is not self.root:
+            return
+        self.root.unbind("<Map>")
+        self.root.update_idletasks()
+        STARTUP.mark("first paint")
+        self.root.after(1, self.startup_step)
+
+    def startup_step(self):
+        label, stage = self.startup_stages.popleft()
+        stage()
+        STARTUP.mark(label)
+        if self.startup_stages:
+            self.root.after(1, self.startup_step)
+            return
+        if self.status_var.get() == "Loading catalog…":
+            self.set_status("Ready")
+        if self.timeline:
+            print(STARTUP.report())
+
+    def start_background_jobs(self):
+        self.scan_overdue()  # loans may have fallen due while we were closed
+        if self.snapshot is not None:
+            self.root.after(2000, self.poll_snapshot)
+        if self.publisher is not None:
+            self.publish_snapshot()
 
     # ---------- ttk Style ---------- #
     def init_style(self):
@@ -278,6 +2382,16 @@ class SmartUI:
             command=self.reset_search,
         ).pack(side="left", padx=10)
 
+        self.on_shelf_only = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            search_box,
+            text="On shelf only",
+            variable=self.on_shelf_only,
+            bg="#f0fdf4",
+            font=("Segoe UI", 8),
+            command=self.search,
+        ).pack(anchor="w", padx=6, pady=(0, 4))
+
         # ---- Library Stats ----
         stats_card = tk.Frame(left, bg=self.bg_card, bd=1, relief="solid")
         stats_card.pack(fill="x", pady=(0, 8))
@@ -325,14 +2439,10 @@ class SmartUI:
             justify="left",
         ).pack(anchor="w", padx=10, pady=(0, 4))
 
-        self.shelf_canvas = tk.Canvas(
-            stats_card,
-            width=220,
-            height=90,
-            bg=self.bg_card,
-            highlightthickness=0,
+        self.shelf_bars = ShelfBars(
+            stats_card, width=220, height=90, bg=self.bg_card, fill=self.primary_soft
         )
-        self.shelf_canvas.pack(anchor="w", padx=6, pady=(0, 4))
+        self.shelf_bars.pack(anchor="w", padx=6, pady=(0, 4))
 
         cap_frame = tk.Frame(stats_card, bg=self.bg_card)
         cap_frame.pack(anchor="w", padx=10, pady=(4, 10))
@@ -360,6 +2470,51 @@ class SmartUI:
             command=self.expand_shelf_capacity,
         ).grid(row=0, column=2, padx=2)
 
+        self.staff_only(
+            tk.Button(
+                cap_frame,
+                text="Report",
+                bg="#4b5563",
+                fg="white",
+                relief="flat",
+                font=("Segoe UI", 9),
+                command=self.export_shelf_report,
+            )
+        ).grid(row=1, column=2, padx=2, pady=(4, 0))
+
+        tk.Button(
+            cap_frame,
+            text="Rebalance",
+            bg=self.accent_purple,
+            fg="white",
+            relief="flat",
+            font=("Segoe UI", 9),
+            command=self.rebalance_shelves,
+        ).grid(row=1, column=1, padx=4, pady=(4, 0), sticky="w")
+
+        self.export_choice = tk.StringVar(value="Inventory")
+        self.staff_only(
+            ttk.Combobox(
+                cap_frame,
+                textvariable=self.export_choice,
+                values=["Inventory", "Shelf occupancy", "Route lengths"],
+                state="readonly",
+                width=11,
+            )
+        ).grid(row=2, column=1, padx=4, pady=(4, 0), sticky="w")
+
+        self.staff_only(
+            tk.Button(
+                cap_frame,
+                text="Export",
+                bg="#4b5563",
+                fg="white",
+                relief="flat",
+                font=("Segoe UI", 9),
+                command=self.start_export,
+            )
+        ).grid(row=2, column=2, padx=2, pady=(4, 0))
+
         # ---- Route card ----
         route_card = tk.Frame(left, bg=self.bg_card, bd=1, relief="solid")
         route_card.pack(fill="x", pady=(0, 0))
@@ -409,20 +2564,30 @@ class SmartUI:
             font=("Segoe UI", 11, "bold"),
         ).pack(anchor="w", padx=10, pady=(8, 0))
 
-        cols = ("title", "author", "shelf")
-        self.tree = ttk.Treeview(mid, columns=cols, show="headings", height=12)
+        cols = ("title", "author", "shelf", "status")
+        self.tree = ttk.Treeview(
+            mid,
+            columns=cols,
+            show="headings",
+            height=12,
+            yscrollcommand=self.on_tree_scroll,
+        )
         self.tree.pack(fill="both", expand=True, padx=10, pady=8)
 
         self.tree.heading("title", text="Title")
         self.tree.heading("author", text="Author")
         self.tree.heading("shelf", text="Shelf")
+        self.tree.heading("status", text="Status")
 
         self.tree.column("title", anchor="center", width=200)
         self.tree.column("author", anchor="center", width=170)
         self.tree.column("shelf", anchor="center", width=80)
+        self.tree.column("status", anchor="center", width=120)
 
         self.tree.tag_configure("oddrow", background="#f9fafb")
         self.tree.tag_configure("evenrow", background="#ffffff")
+        self.tree.tag_configure("onloan", foreground="#6b7280")
+        self.tree.tag_configure("overdue", foreground=self.accent_red)
         self.tree.bind("<<TreeviewSelect>>", self.select_row)
 
         # ========== RIGHT PANEL ==========
@@ -527,6 +2692,24 @@ class SmartUI:
             command=self.clear_form,
         ).grid(row=0, column=3, padx=4, pady=2)
 
+        for col, (text, command) in enumerate(
+            (
+                ("Check Out", self.check_out_book),
+                ("Check In", self.check_in_book),
+                ("Hold", self.place_hold),
+            )
+        ):
+            tk.Button(
+                btns,
+                text=text,
+                bg=self.primary,
+                fg="white",
+                width=8,
+                relief="flat",
+                font=("Segoe UI", 9),
+                command=command,
+            ).grid(row=1, column=col, padx=4, pady=2)
+
         # ---- Map card ----
         map_card = tk.Frame(right, bg=self.bg_card, bd=1, relief="solid")
         map_card.grid(row=1, column=0, sticky="new")
@@ -543,6 +2726,52 @@ class SmartUI:
             fill="x", padx=10, pady=(2, 4)
         )
 
+        map_btns = tk.Frame(map_card, bg=self.bg_card)
+        map_btns.pack(anchor="w", padx=10)
+        self.map_btns = map_btns
+
+        tk.Checkbutton(
+            map_btns,
+            text="Traffic heatmap",
+            variable=self.show_heat,
+            bg=self.bg_card,
+            font=("Segoe UI", 8),
+            command=self.draw_map,
+        ).pack(side="left")
+
+        aisles = sorted({" ↔ ".join(aisle(a, b)) for a in GRAPH for b in GRAPH[a]})
+        self.staff_only(
+            ttk.Combobox(
+                map_btns,
+                textvariable=self.aisle_choice,
+                values=aisles,
+                state="readonly",
+                width=18,
+            )
+        ).pack(side="left", padx=(8, 2))
+
+        self.staff_only(
+            tk.Button(
+                map_btns,
+                text="Close/Open",
+                bg=self.accent_red,
+                fg="white",
+                relief="flat",
+                font=("Segoe UI", 8, "bold"),
+                command=self.toggle_aisle,
+            )
+        ).pack(side="left")
+
+        tk.Button(
+            map_btns,
+            text="Plan Carts",
+            bg=self.accent_blue,
+            fg="white",
+            relief="flat",
+            font=("Segoe UI", 8, "bold"),
+            command=self.plan_carts,
+        ).pack(side="left", padx=(6, 0))
+
         self.map = tk.Canvas(
             map_card,
             bg="white",
@@ -564,8 +2793,6 @@ class SmartUI:
 
         tk.Frame(right, bg=self.bg_main).grid(row=2, column=0, sticky="nsew")
 
-        self.draw_map()
-
         bottom = tk.Frame(self.root, bg="#e5f5ef")
         bottom.pack(side="bottom", fill="x")
 
@@ -580,7 +2807,13 @@ class SmartUI:
 
     # ---------- Developers popup ---------- #
     def show_developers(self):
-        win = tk.Toplevel(self.root)
+        # built on first use, then hidden and re-shown instead of rebuilt
+        if self.dev_win is not None:
+            self.dev_win.deiconify()
+            self.dev_win.lift()
+            return
+        win = self.dev_win = tk.Toplevel(self.root)
+        win.protocol("WM_DELETE_WINDOW", win.withdraw)
         win.title("Developers")
         win.configure(bg=self.bg_card)
         win.resizable(False, False)
@@ -683,7 +2916,7 @@ class SmartUI:
             fg="white",
             relief="flat",
             font=("Segoe UI", 9),
-            command=win.destroy,
+            command=win.withdraw,
         ).pack(pady=(0, 12))
 
     # ================== MAP / STATS / CRUD / SEARCH ================== #
@@ -706,6 +2939,24 @@ class SmartUI:
         line("Hall-2", "Shelf-D")
         line("Hall-2", "Shelf-E")
 
+        if self.show_heat.get():
+            self.draw_heatmap()
+
+        for (a, b), cost in EDGE_STATE.items():
+            if a not in xy or b not in xy:
+                continue
+            x1, y1 = xy[a]
+            x2, y2 = xy[b]
+            self.map.create_line(
+                x1 + 22,
+                y1 + 22,
+                x2 + 22,
+                y2 + 22,
+                fill=self.accent_red if cost == INF else self.accent_orange,
+                width=3,
+                dash=(4, 3),
+            )
+
         for label, (x, y) in xy.items():
             self.map.create_oval(
                 x,
@@ -725,9 +2976,29 @@ class SmartUI:
                 font=("Segoe UI", 9, "bold"),
             )
 
-    def animate(self, nodes):
-        if not nodes:
+    def draw_heatmap(self):
+        heat = TELEMETRY.edge_heat()
+        if not heat:
             return
+        top = max(heat.values())
+        for (a, b), n in heat.items():
+            if a not in NODE_POS or b not in NODE_POS or n <= 0:
+                continue
+            level = n / top
+            x1, y1 = NODE_POS[a]
+            x2, y2 = NODE_POS[b]
+            # light yellow -> red, thicker for busier aisles
+            green = int(0xE0 - 0xB0 * level)
+            self.map.create_line(
+                x1 + 22,
+                y1 + 22,
+                x2 + 22,
+                y2 + 22,
+                fill=f"#ff{green:02x}40",
+                width=3 + int(7 * level),
+            )
+
+    def draw_route(self, nodes):
         self.draw_map()
         xy = NODE_POS
         for i in range(len(nodes) - 1):
@@ -743,6 +3014,83 @@ class SmartUI:
                 width=4,
             )
 
+    # ---------- Carts (multi-agent) ---------- #
+    CART_COLORS = ("#2563eb", "#db2777", "#f59e0b", "#7c3aed", "#0891b2", "#65a30d")
+
+    def cart_jobs(self):
+        # demo batch: carts at the entrance and the near shelves all head
+        # for the far shelves at the same time
+        shelves = [s for s in SHELF_CAPACITY if s in GRAPH]
+        half = len(shelves) // 2
+        starts = ["Entrance"] + shelves[:half]
+        return [
+            (f"Cart-{i + 1}", start, goal)
+            for i, (start, goal) in enumerate(zip(starts, shelves[half:]))
+        ]
+
+    def plan_carts(self, jobs=None):
+        jobs = self.cart_jobs() if jobs is None else jobs
+        start = time.perf_counter()
+        paths = CARTS.plan(jobs)
+        ms = (time.perf_counter() - start) * 1000
+        planned = {name: p for name, p in paths.items() if p}
+        self.set_status(
+            f"Planned {len(planned)}/{len(jobs)} cart(s) without collisions "
+            f"in {ms:.1f} ms."
+        )
+        self.show_cart_paths(planned)
+
+    def show_cart_paths(self, paths):
+        if self.cart_job is not None:
+            self.root.after_cancel(self.cart_job)
+            self.cart_job = None
+        self.cart_paths = paths
+        self.draw_map()
+        xy = NODE_POS
+        for n, (name, path) in enumerate(paths.items()):
+            color = self.CART_COLORS[n % len(self.CART_COLORS)]
+            offset = 18 + (n % 5) * 2  # keep overlapping routes visible
+            for a, b in zip(path, path[1:]):
+                if a == b:
+                    continue
+                x1, y1 = xy[a]
+                x2, y2 = xy[b]
+                self.map.create_line(
+                    x1 + offset,
+                    y1 + offset,
+                    x2 + offset,
+                    y2 + offset,
+                    fill=color,
+                    width=2,
+                    tags="carts",
+                )
+        self.step_carts(0)
+
+    def step_carts(self, t):
+        self.map.delete("cart")
+        xy = NODE_POS
+        horizon = max((len(p) for p in self.cart_paths.values()), default=0)
+        for n, path in enumerate(self.cart_paths.values()):
+            x, y = xy[path[min(t, len(path) - 1)]]
+            self.map.create_oval(
+                x + 14,
+                y + 14,
+                x + 30,
+                y + 30,
+                fill=self.CART_COLORS[n % len(self.CART_COLORS)],
+                outline="white",
+                tags="cart",
+            )
+        if t + 1 < horizon:
+            self.cart_job = self.root.after(500, self.step_carts, t + 1)
+        else:
+            self.cart_job = None
+
+    def animate(self, nodes):
+        if not nodes:
+            return
+        self.draw_route(nodes)
+        xy = NODE_POS
         self.root.update()
         delay = 0.25
         for node in nodes:
@@ -760,59 +3108,57 @@ class SmartUI:
             self.map.delete(dot)
 
     def count_shelf_books(self, shelf):
-        return sum(1 for b in BOOKS if b["shelf"] == shelf)
+        if self.catalog is not None:
+            return self.catalog.counts.get(shelf, 0)
+        return CATALOG.count(shelf)
+
+    def book_count(self):
+        if self.catalog is not None:
+            return len(self.catalog)
+        return len(BOOKS)
+
+    def shelf_usage(self):
+        # (shelf, used, capacity) for every shelf, from the incremental counts
+        return [
+            (shelf, self.count_shelf_books(shelf), cap)
+            for shelf, cap in SHELF_CAPACITY.items()
+        ]
+
+    def load_analytics(self):
+        # full vectorized reload; only the report needs it, not every edit
+        self.analytics.set_capacity(SHELF_CAPACITY)
+        if self.catalog is not None:
+            self.analytics.load_catalog(self.catalog)
+        else:
+            self.analytics.load_books(BOOKS)
+
+    CAPACITY_LINES = 5
 
     def update_stats(self):
-        total = len(BOOKS)
+        total = self.book_count()
         self.total_var.set(f"Total Books: {total}")
 
-        msg_lines = []
-        per_shelf = []
-        total_cap = 0
-
-        for shelf, cap in SHELF_CAPACITY.items():
-            used = self.count_shelf_books(shelf)
-            msg_lines.append(f"{shelf}: {used}/{cap}")
-            total_cap += cap
-            per_shelf.append((shelf, used, cap))
+        per_shelf = self.shelf_usage()
+        # the bars cover every shelf; the label only names the fullest few
+        listed = per_shelf
+        if len(per_shelf) > self.CAPACITY_LINES:
+            listed = heapq.nlargest(
+                self.CAPACITY_LINES,
+                per_shelf,
+                key=lambda row: row[1] / row[2] if row[2] else INF,
+            )
+        msg_lines = [f"{shelf}: {used}/{cap}" for shelf, used, cap in listed]
+        if len(listed) < len(per_shelf):
+            msg_lines.append(f"… and {len(per_shelf) - len(listed)} more shelves")
+        self.placer.set_counts({shelf: used for shelf, used, _ in per_shelf})
+        total_cap = sum(cap for _, _, cap in per_shelf)
 
         self.capacity_var.set("\n".join(msg_lines))
         self.stats_chip_var.set(
             f"Books: {total} · Shelves: {len(SHELF_CAPACITY)} · Capacity: {total_cap}"
         )
 
-        self.shelf_canvas.delete("all")
-        x = 6
-        y = 14
-        max_width = 180
-        for shelf, used, cap in per_shelf:
-            ratio = 0 if cap == 0 else used / cap
-            w = int(max_width * ratio)
-            self.shelf_canvas.create_text(
-                x,
-                y,
-                text=shelf.replace("Shelf-", "S-"),
-                anchor="w",
-                font=("Segoe UI", 8),
-            )
-            self.shelf_canvas.create_rectangle(
-                x + 28,
-                y - 5,
-                x + 28 + max_width,
-                y + 5,
-                outline="#d1d5db",
-                fill="#f3f4f6",
-            )
-            if w > 0:
-                self.shelf_canvas.create_rectangle(
-                    x + 28,
-                    y - 5,
-                    x + 28 + w,
-                    y + 5,
-                    outline="",
-                    fill=self.primary_soft,
-                )
-            y += 16
+        self.shelf_bars.update(per_shelf)
 
     def set_status(self, text):
         self.status_var.set(text)
@@ -822,6 +3168,10 @@ class SmartUI:
         self.a.set("")
         self.s.set("Shelf-A")
         self.edit_index = None
+        self.edit_id = None
+        self.edit_version = 0
+        self.last_route_shelf = None
+        self.cart_paths = {}
         self.set_status("Form cleared, no row selected.")
         self.route_path_var.set("Path: -")
         self.route_steps_var.set("Steps: -")
@@ -831,85 +3181,463 @@ class SmartUI:
         self.draw_map()
 
     def expand_shelf_capacity(self):
+        if not self.check_writable():
+            return
         choice = self.capacity_choice.get()
         if choice == "All Shelves":
             for shelf in SHELF_CAPACITY:
-                SHELF_CAPACITY[shelf] += 1
+                CATALOG.expand(shelf)
             self.set_status("Shelf capacity increased by 1 for all shelves.")
         else:
-            SHELF_CAPACITY[choice] += 1
+            CATALOG.expand(choice)
             self.set_status(f"{choice} capacity increased by 1.")
+        self.mark_dirty()
         self.update_stats()
 
+    def suggest_shelf(self, shelf):
+        # returns the shelf to use, or None if the user declines / all full
+        alt = self.placer.nearest_free(shelf)
+        used = self.count_shelf_books(shelf)
+        if alt is None:
+            messagebox.showerror(
+                "Shelf Full",
+                f"{shelf} is full ({used}/{SHELF_CAPACITY[shelf]}) and no other "
+                f"shelf has space. Increase capacity.",
+            )
+            return None
+        if messagebox.askyesno(
+            "Shelf Full",
+            f"{shelf} is full ({used}/{SHELF_CAPACITY[shelf]}).\n"
+            f"Nearest shelf with space is {alt}. Place it there instead?",
+        ):
+            return alt
+        return None
+
+    def rebalance_shelves(self):
+        if not self.check_writable():
+            return
+        self.materialize_catalog()
+        self.update_stats()
+        # plan on a copy so the ids/versions are those the plan was made from
+        with CATALOG.lock:
+            books = [dict(b) for b in BOOKS]
+        try:
+            moves = self.placer.plan_rebalance(books, weights=TELEMETRY.tag_heat())
+        except ValueError as e:
+            return messagebox.showerror("Rebalance Shelves", str(e))
+        if not moves:
+            self.set_status("Shelves already balanced – nothing to move.")
+            return
+        if not messagebox.askyesno(
+            "Rebalance Shelves",
+            f"Move {len(moves)} book(s) so each author's books sit together "
+            f"on the shelves nearest the entrance?",
+        ):
+            return
+        try:
+            CATALOG.move_books(
+                [(books[i]["id"], books[i]["version"], new) for i, _, new in moves]
+            )
+        except (ConflictError, ShelfFullError) as e:
+            self.refresh_books()
+            return messagebox.showwarning(
+                "Rebalance Shelves", f"{e} Nothing was moved; please try again."
+            )
+        self.drop_search_shards()
+        self.mark_dirty()
+        self.refresh_books()
+        self.clear_form()
+        self.set_status(f"Rebalanced shelves: {len(moves)} book(s) moved.")
+
+    def export_shelf_report(self):
+        if not self.check_writable():
+            return
+        if self.analytics is None:
+            return messagebox.showerror(
+                "Report", "Shelf analytics need NumPy (pip install numpy)."
+            )
+        path = filedialog.asksaveasfilename(
+            title="Save shelf report",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv")],
+        )
+        if not path:
+            return
+        self.load_analytics()
+        rows = itertools.chain(
+            self.analytics.report_rows(), self.analytics.summary_rows()
+        )
+        self.run_export(rows, SHELF_FIELDS, path, fmt="csv")
+
+    # ---------- Streaming export ---------- #
+    def start_export(self):
+        if not self.check_writable():
+            return
+        choice = self.export_choice.get()
+        path = filedialog.asksaveasfilename(
+            title=f"Export {choice.lower()}",
+            defaultextension=".csv",
+            filetypes=[
+                ("CSV", "*.csv"),
+                ("JSON Lines", "*.jsonl"),
+                ("Compressed CSV", "*.csv.gz"),
+                ("Compressed JSON Lines", "*.jsonl.gz"),
+            ],
+        )
+        if not path:
+            return
+        if choice == "Shelf occupancy" and self.analytics is not None:
+            self.load_analytics()
+            rows, fields = self.analytics.report_rows(), SHELF_FIELDS
+        elif choice == "Shelf occupancy":
+            rows, fields = shelf_rows(self.count_shelf_books), SHELF_FIELDS
+        elif choice == "Route lengths":
+            rows, fields = route_rows(), ROUTE_FIELDS
+        else:
+            rows, fields = inventory_rows(self.catalog), INVENTORY_FIELDS
+        self.run_export(rows, fields, path)
+
+    def run_export(self, rows, fields, path, fmt=None):
+        if self.export_job is not None:
+            return self.set_status("An export is already running.")
+        try:
+            self.export_job = ExportJob(rows, fields, path, fmt=fmt)
+        except OSError as e:
+            return messagebox.showerror("Export", str(e))
+        self.export_name = os.path.basename(path)
+        self.root.after_idle(self.export_step)
+
+    def export_step(self):
+        job = self.export_job
+        try:
+            # don't queue more than the writer thread can absorb
+            more = True if job.writer.full() else job.step()
+        except (OSError, ValueError) as e:
+            # ValueError: the catalog buffer was swapped out mid-export
+            job.abort()
+            self.export_job = None
+            return self.set_status(f"Export failed: {e}")
+        if more:
+            self.set_status(f"Exporting {self.export_name}: {job.written} row(s)…")
+            self.root.after(1, self.export_step)
+        else:
+            self.export_job = None
+            self.set_status(f"Exported {job.written} row(s) to {self.export_name}.")
+
+    # ---------- Binary catalog ---------- #
+    def insert_catalog_rows(self, indices):
+        start = len(self.tree.get_children())
+        for n, i in enumerate(indices, start):
+            b = self.catalog.record(i)
+            tags = ("evenrow" if n % 2 == 0 else "oddrow",)
+            if self.read_only:
+                # kiosks only know the availability saved in the snapshot
+                flags, status = self.catalog.flags(i), self.catalog.status(i)
+            else:
+                flags, status = CIRCULATION.flags(b["id"]), CIRCULATION.status(b["id"])
+            if flags & BOOK_OVERDUE:
+                tags += ("overdue",)
+            elif flags & BOOK_ON_LOAN:
+                tags += ("onloan",)
+            self.tree.insert(
+                "",
+                "end",
+                iid=f"cat-{i}",
+                values=(b["title"], b["author"], b["shelf"], status),
+                tags=tags,
+            )
+
+    def load_catalog_page(self):
+        if self.catalog is None:
+            return
+        page = self.catalog_next_page
+        if self.catalog_hits is not None:
+            size = self.catalog.page_size
+            rows = self.catalog_hits[page * size : (page + 1) * size]
+            if not rows:
+                return
+        elif page < self.catalog.page_count:
+            rows = self.catalog.page_range(page)
+        else:
+            return
+        self.insert_catalog_rows(rows)
+        self.catalog_next_page += 1
+
+    def on_tree_scroll(self, first, last):
+        # pull in the next page once the user nears the end of what is loaded
+        if self.catalog is not None and self.catalog_next_page > 0:
+            if float(last) >= 0.9:
+                self.root.after_idle(self.load_catalog_page)
+
+    def materialize_catalog(self, refresh=True):
+        if self.catalog is None or self.read_only:
+            return
+        CATALOG.load([self.catalog.record(i) for i in range(len(self.catalog))])
+        self.catalog.close()
+        self.catalog = None
+        self.catalog_next_page = 0
+        self.catalog_hits = None
+        # BOOKS keeps the file order, so a selected cat-<index> row maps over
+        if self.edit_index is not None and self.edit_id is None:
+            b = BOOKS[self.edit_index]
+            self.edit_id = b["id"]
+            self.edit_version = b["version"]
+        if refresh:
+            # the table still holds cat-<index> rows; rebuild it with book ids
+            self.refresh_books()
+
+    def on_close(self):
+        if self.export_job is not None:
+            # stop the writer thread cleanly; a half-written export is removed
+            self.export_job.abort()
+            try:
+                os.remove(self.export_job.path)
+            except OSError:
+                pass
+        if self.snapshot is not None:
+            self.snapshot.close()
+        elif self.catalog_path and self.catalog_dirty:
+            self.materialize_catalog(refresh=False)
+            save_catalog(
+                self.catalog_path, BOOKS, SHELF_CAPACITY, flags=CIRCULATION.flags
+            )
+            if self.analytics is not None:
+                self.analytics.save_history(self.catalog_path + ".adds.json")
+        elif self.catalog is not None:
+            self.catalog.close()
+        if self.catalog_path and self.snapshot is None:
+            CIRCULATION.save(self.catalog_path + ".loans.json")
+        if self.publisher is not None:
+            self.publisher.close()
+        self.drop_search_shards()
+        self.root.destroy()
+
+    # ---------- Shared-memory snapshot ---------- #
+    def mark_dirty(self):
+        self.catalog_dirty = True
+        if self.publisher is not None and self.publish_job is None:
+            # coalesce a burst of edits into one new snapshot
+            self.publish_job = self.root.after(500, self.publish_snapshot)
+
+    def publish_snapshot(self):
+        self.publish_job = None
+        if self.catalog is not None:
+            return self.finish_publish(self.catalog.buf)  # already in that layout
+        if self.publish_busy:
+            self.publish_again = True  # edits arrived while encoding
+            return
+        # copy what the image needs, then encode it on a worker thread so a
+        # large catalog does not stall the window
+        with CATALOG.lock:
+            books = [dict(b) for b in BOOKS]
+        capacity = dict(SHELF_CAPACITY)
+        loans = {book_id: CIRCULATION.flags(book_id) for book_id in CIRCULATION.loans}
+        result = []
+
+        def encode():
+            try:
+                result.append(
+                    build_catalog(books, capacity, flags=lambda i: loans.get(i, 0))
+                )
+            except Exception as e:  # reported on the Tk thread
+                result.append(e)
+
+        thread = threading.Thread(target=encode, daemon=True)
+        thread.start()
+        self.publish_busy = True
+        self.root.after(20, self.poll_publish, thread, result)
+
+    def poll_publish(self, thread, result):
+        if thread.is_alive():
+            self.root.after(20, self.poll_publish, thread, result)
+            return
+        self.publish_busy = False
+        if isinstance(result[0], Exception):
+            self.set_status(f"Snapshot not published: {result[0]}")
+        else:
+            self.finish_publish(result[0])
+        if self.publish_again:
+            self.publish_again = False
+            self.publish_snapshot()
+
+    def finish_publish(self, image):
+        gen = self.publisher.publish(image)
+        self.set_status(f"Catalog snapshot {gen // 2} published for kiosks.")
+
+    def poll_snapshot(self):
+        if self.snapshot.refresh():
+            self.catalog = self.snapshot.view
+            SHELF_CAPACITY.update(self.catalog.capacity)
+            self.refresh_books()
+            self.set_status(
+                f"Catalog updated (snapshot {self.snapshot.generation // 2})."
+            )
+        elif self.snapshot.view is None:
+            self.set_status(
+                f"Waiting for catalog '{self.snapshot.name}' to be published…"
+            )
+        self.root.after(2000, self.poll_snapshot)
+
+    def staff_only(self, widget):
+        # controls that write files or change shared state are off on kiosks
+        if self.read_only:
+            widget.configure(state="disabled")
+        return widget
+
+    def check_writable(self):
+        if self.read_only:
+            messagebox.showinfo("Kiosk", "This kiosk shows a read-only catalog.")
+            return False
+        return True
+
+    # ---------- Sharded search ---------- #
+    def search_shards(self):
+        if self.sharded is None and self.search_workers and self.catalog is None:
+            self.sharded = ShardedSearch(
+                BOOKS, workers=self.search_workers, loaned=CIRCULATION.loans
+            )
+        return self.sharded
+
+    def drop_search_shards(self):
+        if self.sharded is not None:
+            self.sharded.close()
+            self.sharded = None
+
     def refresh_books(self, book_list=None):
-        if book_list is None:
-            book_list = BOOKS
         for i in self.tree.get_children():
             self.tree.delete(i)
+        if book_list is None and self.catalog is not None:
+            self.catalog_next_page = 0
+            self.catalog_hits = None
+            self.load_catalog_page()
+            self.update_stats()
+            return
+        if book_list is None:
+            book_list = BOOKS
         for idx, b in enumerate(book_list):
-            tag = "evenrow" if idx % 2 == 0 else "oddrow"
+            tags = ("evenrow" if idx % 2 == 0 else "oddrow",)
+            if b["id"] in CIRCULATION.overdue:
+                tags += ("overdue",)
+            elif b["id"] in CIRCULATION.loans:
+                tags += ("onloan",)
             self.tree.insert(
-                "", "end", values=(b["title"], b["author"], b["shelf"]), tags=(tag,)
+                "",
+                "end",
+                iid=f"book-{b['id']}",
+                values=(
+                    b["title"],
+                    b["author"],
+                    b["shelf"],
+                    CIRCULATION.status(b["id"]),
+                ),
+                tags=tags,
             )
         self.update_stats()
 
     def find_path(self, shelf):
-        return astar(GRAPH, "Entrance", shelf)
+        self.last_route_shelf = shelf
+        return ROUTES.route("Entrance", shelf)
+
+    def toggle_aisle(self):
+        if not self.check_writable():
+            return
+        choice = self.aisle_choice.get()
+        if not choice:
+            return self.set_status("Pick an aisle to close or reopen.")
+        a, b = choice.split(" ↔ ")
+        closed = EDGE_STATE.get(aisle(a, b)) == INF
+        start = time.perf_counter()
+        touched = ROUTES.set_aisle(a, b, 1 if closed else INF)
+        ms = (time.perf_counter() - start) * 1000
+        self.set_status(
+            f"Aisle {choice} {'reopened' if closed else 'closed'} – "
+            f"{touched} node(s) replanned in {ms:.2f} ms."
+        )
+        if self.last_route_shelf is not None:
+            self.show_route(self.last_route_shelf, animate=False)
+        else:
+            self.draw_map()
 
     def select_row(self, event):
         sel = self.tree.selection()
         if not sel:
             return
-        vals = self.tree.item(sel[0], "values")
-        title, author, shelf = vals
-
         self.edit_index = None
-        for i, b in enumerate(BOOKS):
-            if b["title"] == title and b["author"] == author and b["shelf"] == shelf:
-                self.edit_index = i
-                break
-        if self.edit_index is None:
-            return
+        self.edit_id = None
+        self.edit_version = 0
+        kind, _, key = sel[0].partition("-")
+        if kind == "cat":
+            if self.catalog is None:
+                return
+            self.edit_index = int(key)
+            b = self.catalog.record(self.edit_index)
+        else:
+            b = CATALOG.get(int(key))
+            if b is None:
+                return
+            self.edit_index = BOOKS.index(b)
+            self.edit_id = b["id"]
+            self.edit_version = b["version"]
 
-        b = BOOKS[self.edit_index]
         self.t.set(b["title"])
         self.a.set(b["author"])
         self.s.set(b["shelf"])
 
-        path = self.find_path(b["shelf"])
+        path = self.show_route(b["shelf"])
+        if path:
+            TELEMETRY.record(path, tag=b["author"])
+
+    def show_route(self, shelf, animate=True):
+        path = self.find_path(shelf)
         if path:
             steps = len(path) - 1
             self.route_path_var.set("Path: " + " → ".join(path))
             self.route_steps_var.set(f"Steps: {steps}")
-            self.set_status(f"A* found path to {b['shelf']} ({steps} step/s).")
+            self.set_status(f"Found shortest path to {shelf} ({steps} step/s).")
             self.path_info_var.set(
-                f"A* selected the path with {steps} step(s) from Entrance to {b['shelf']}."
+                f"Shortest open path from Entrance to {shelf}: {steps} step(s)."
             )
-            self.animate(path)
+            if animate:
+                self.animate(path)
+            else:
+                self.draw_route(path)
         else:
             self.route_path_var.set("Path: No route found.")
             self.route_steps_var.set("Steps: -")
             self.set_status("No route found in graph.")
             self.path_info_var.set("No route found in current map.")
             self.draw_map()
+        return path
 
     def add_book(self):
+        if not self.check_writable():
+            return
         title, author, shelf = self.t.get().strip(), self.a.get().strip(), self.s.get()
         if not title or not author:
             return messagebox.showerror("Error", "Please fill all fields.")
+        self.materialize_catalog()
         used = self.count_shelf_books(shelf)
         if used >= SHELF_CAPACITY[shelf]:
-            return messagebox.showerror(
-                "Shelf Full",
-                f"{shelf} is full ({used}/{SHELF_CAPACITY[shelf]}). "
-                f"Increase capacity or choose another shelf.",
-            )
-        BOOKS.append({"title": title, "author": author, "shelf": shelf})
+            shelf = self.suggest_shelf(shelf)
+            if shelf is None:
+                return
+        try:
+            book = CATALOG.add(title, author, shelf)
+        except ShelfFullError as e:
+            return messagebox.showerror("Shelf Full", str(e))
+        if self.sharded is not None:
+            self.sharded.add(book)
+        self.placer.add(shelf)
+        self.mark_dirty()
+        if self.analytics is not None:
+            self.analytics.record_add(shelf)
         self.refresh_books()
         self.clear_form()
         self.set_status(f"Book '{title}' added to {shelf}.")
 
     def update_book(self):
+        if not self.check_writable():
+            return
         if self.edit_index is None:
             return messagebox.showwarning(
                 "No Selection", "Select a book from the table first."
@@ -920,20 +3648,32 @@ class SmartUI:
         if not new_title or not new_author:
             return messagebox.showerror("Error", "Please fill all fields.")
 
+        self.materialize_catalog()
+        if self.edit_id is None:
+            self.edit_id = BOOKS[self.edit_index]["id"]
         old_shelf = BOOKS[self.edit_index]["shelf"]
         if new_shelf != old_shelf:
             used = self.count_shelf_books(new_shelf)
             if used >= SHELF_CAPACITY[new_shelf]:
-                return messagebox.showerror(
-                    "Shelf Full",
-                    f"{new_shelf} is full ({used}/{SHELF_CAPACITY[new_shelf]}).",
-                )
+                new_shelf = self.suggest_shelf(new_shelf)
+                if new_shelf is None:
+                    return
 
-        BOOKS[self.edit_index] = {
-            "title": new_title,
-            "author": new_author,
-            "shelf": new_shelf,
-        }
+        try:
+            book = CATALOG.update(
+                self.edit_id, self.edit_version, new_title, new_author, new_shelf
+            )
+        except ShelfFullError as e:
+            return messagebox.showerror("Shelf Full", str(e))
+        except ConflictError as e:
+            self.refresh_books()
+            self.clear_form()
+            return messagebox.showwarning("Edit Conflict", f"{e} Table reloaded.")
+        self.edit_version = book["version"]  # keep the selection editable
+        self.placer.move(old_shelf, new_shelf)
+        if self.sharded is not None:
+            self.sharded.update(book, old_shelf)
+        self.mark_dirty()
         self.refresh_books()
         self.set_status(f"Book updated: '{new_title}'.")
         self.route_path_var.set("Path: -")
@@ -944,31 +3684,179 @@ class SmartUI:
         self.draw_map()
 
     def delete_book(self):
+        if not self.check_writable():
+            return
         if self.edit_index is None:
             return messagebox.showwarning(
                 "No Selection", "Select a book from the table first."
             )
+        self.materialize_catalog()
         b = BOOKS[self.edit_index]
+        if self.edit_id is None:
+            self.edit_id = b["id"]
+        if not CIRCULATION.available(b["id"]):
+            return messagebox.showwarning(
+                "On Loan", f"'{b['title']}' is checked out. Check it in first."
+            )
         if messagebox.askyesno(
             "Confirm Delete", f"Delete '{b['title']}' from {b['shelf']}?"
         ):
-            BOOKS.pop(self.edit_index)
+            try:
+                CATALOG.delete(self.edit_id, self.edit_version)
+            except ConflictError as e:
+                self.refresh_books()
+                self.clear_form()
+                return messagebox.showwarning("Edit Conflict", f"{e} Table reloaded.")
+            self.placer.remove(b["shelf"])
+            if self.sharded is not None:
+                self.sharded.remove(b)
+            self.mark_dirty()
             self.refresh_books()
             self.clear_form()
             self.set_status("Book deleted.")
 
+    # ---------- Circulation ---------- #
+    def selected_book(self):
+        if self.edit_index is None:
+            messagebox.showwarning(
+                "No Selection", "Select a book from the table first."
+            )
+            return None
+        self.materialize_catalog()
+        return BOOKS[self.edit_index]
+
+    def ask_patron(self, title):
+        patron = simpledialog.askstring(title, "Patron name or card number:")
+        return patron.strip() if patron and patron.strip() else None
+
+    def check_out_book(self):
+        if not self.check_writable():
+            return
+        b = self.selected_book()
+        if b is None:
+            return
+        patron = self.ask_patron("Check Out")
+        if patron is None:
+            return
+        try:
+            due = CIRCULATION.check_out(b, patron)
+        except CirculationError as e:
+            return messagebox.showerror("Check Out", str(e))
+        if self.sharded is not None:
+            self.sharded.set_loaned(b, True)
+        self.mark_dirty()
+        self.refresh_books()
+        self.clear_form()
+        self.set_status(
+            f"'{b['title']}' checked out to {patron}, due "
+            f"{time.strftime('%Y-%m-%d', time.localtime(due))}."
+        )
+
+    def check_in_book(self):
+        if not self.check_writable():
+            return
+        b = self.selected_book()
+        if b is None:
+            return
+        try:
+            waiting = CIRCULATION.check_in(b)
+        except CirculationError as e:
+            return messagebox.showerror("Check In", str(e))
+        if self.sharded is not None:
+            self.sharded.set_loaned(b, False)
+        self.mark_dirty()
+        self.refresh_books()
+        self.clear_form()
+        if waiting:
+            self.set_status(f"'{b['title']}' checked in – hold waiting for {waiting}.")
+        else:
+            self.set_status(f"'{b['title']}' checked in.")
+
+    def place_hold(self):
+        if not self.check_writable():
+            return
+        b = self.selected_book()
+        if b is None:
+            return
+        patron = self.ask_patron("Place Hold")
+        if patron is None:
+            return
+        try:
+            pos = CIRCULATION.place_hold(b["title"], patron)
+        except CirculationError as e:
+            return messagebox.showerror("Place Hold", str(e))
+        self.set_status(
+            f"Hold placed on '{b['title']}' for {patron} (#{pos} in queue)."
+        )
+
+    def scan_overdue(self):
+        found = CIRCULATION.scan_overdue()
+        if found:
+            self.mark_dirty()
+            self.set_status(f"{len(found)} loan(s) just became overdue.")
+            if self.catalog is None:
+                for book_id, _, _ in found:
+                    iid = f"book-{book_id}"
+                    if self.tree.exists(iid):
+                        self.tree.set(iid, "status", CIRCULATION.status(book_id))
+                        self.tree.item(
+                            iid, tags=self.tree.item(iid, "tags") + ("overdue",)
+                        )
+        self.root.after(OVERDUE_SCAN_MS, self.scan_overdue)
+
+    def catalog_matches(self, q, on_shelf):
+        # scan the prebuilt search keys without decoding non-matching rows
+        if self.read_only or not on_shelf:
+            return self.catalog.search(q, on_shelf_only=on_shelf)
+        # staff view of a mapped file: live loans beat the flags saved in it
+        loans = CIRCULATION.loans
+        hits = self.catalog.search(q) if q else range(len(self.catalog))
+        return (i for i in hits if self.catalog.book_id(i) not in loans)
+
     def search(self):
         q = self.q.get().strip().lower()
-        if not q:
+        on_shelf = self.on_shelf_only.get()
+        if not q and not on_shelf:
             self.refresh_books()
             self.set_status("Search box empty – showing all books.")
             return
+        if self.catalog is not None:
+            for i in self.tree.get_children():
+                self.tree.delete(i)
+            self.catalog_hits = list(self.catalog_matches(q, on_shelf))
+            self.catalog_next_page = 0
+            self.load_catalog_page()
+            self.update_stats()
+            self.set_status(f"Search result: {len(self.catalog_hits)} book(s) found.")
+            return
+        if not q:
+            loans = CIRCULATION.loans
+            self.refresh_books([b for b in BOOKS if b["id"] not in loans])
+            self.set_status("Showing books currently on the shelf.")
+            return
+        loans = CIRCULATION.loans if on_shelf else {}
+        shards = self.search_shards()
+        if shards is not None:
+            try:
+                total, result = shards.search(q, on_shelf_only=bool(loans))
+            except EOFError:
+                # a worker died: start a fresh pool from BOOKS and retry once
+                self.drop_search_shards()
+                shards = self.search_shards()
+                total, result = shards.search(q, on_shelf_only=bool(loans))
+            self.refresh_books(result)
+            shown = f" (top {len(result)} shown)" if total > len(result) else ""
+            self.set_status(f"Search result: {total} book(s) found{shown}.")
+            return
         result = [
             b
             for b in BOOKS
-            if q in b["title"].lower()
-            or q in b["author"].lower()
-            or q in b["shelf"].lower()
+            if (
+                q in b["title"].lower()
+                or q in b["author"].lower()
+                or q in b["shelf"].lower()
+            )
+            and b["id"] not in loans
         ]
         self.refresh_books(result)
         self.set_status(f"Search result: {len(result)} book(s) found.")
@@ -980,6 +3868,75 @@ class SmartUI:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Smart Library System")
+    parser.add_argument(
+        "catalog",
+        nargs="?",
+        help="binary catalog file to open (created on exit if missing)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="search with this many worker processes (0 = in-process)",
+    )
+    parser.add_argument(
+        "--publish",
+        metavar="NAME",
+        help="publish the catalog to shared memory for kiosks under NAME",
+    )
+    parser.add_argument(
+        "--kiosk",
+        metavar="NAME",
+        help="read-only kiosk attached to the shared-memory catalog NAME",
+    )
+    parser.add_argument(
+        "--build-ch",
+        action="store_true",
+        help="precompute the contraction hierarchy for GRAPH and exit",
+    )
+    parser.add_argument(
+        "--stress",
+        action="store_true",
+        help="run the concurrent catalog stress check and exit",
+    )
+    parser.add_argument(
+        "--timeline",
+        action="store_true",
+        help="print the startup timeline once the window is fully loaded",
+    )
+    args = parser.parse_args()
+    STARTUP.mark("arguments parsed")
+
+    if args.build_ch:
+        start = time.perf_counter()
+        ch = ContractionHierarchy.build(GRAPH)
+        ch.save()
+        shortcuts = sum(via is not None for e in ch.up.values() for _, _, via in e)
+        print(
+            f"Contraction hierarchy: {len(ch.rank)} nodes, {shortcuts} shortcuts, "
+            f"built in {time.perf_counter() - start:.2f}s -> {CH_PATH}"
+        )
+        sys.exit(0)
+
+    if args.stress:
+        adds, conflicts, full = stress_catalog()
+        print(
+            f"Catalog stress OK: {adds} adds, {conflicts} version conflicts, "
+            f"{full} shelf-full rejections, no shelf over capacity."
+        )
+        sys.exit(0)
+
+    ROUTES.load_ch()
+    STARTUP.mark("route index loaded")
     root = tk.Tk()
-    app = SmartUI(root)
+    STARTUP.mark("Tk ready")
+    app = SmartUI(
+        root,
+        catalog_path=args.catalog,
+        search_workers=args.workers,
+        snapshot=args.kiosk,
+        publish=args.publish,
+        timeline=args.timeline,
+    )
     root.mainloop()